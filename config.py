@@ -15,3 +15,34 @@ payment_chat = os.getenv('PAYMENT_CHAT')
 payment_chat_id = int(os.getenv('PAYMENT_CHAT_ID', 0))
 FRAUD_CHAT_ID = int(os.getenv('FRAUD_CHAT_ID', 0))
 TASK_LOG_CHAT_ID = int(os.getenv('TASK_LOG_CHAT_ID', 0))
+
+# Отложенные награды: 'batch' — пачками set-based запросами, 'row' — по одной
+REWARD_SETTLEMENT_MODE = os.getenv('REWARD_SETTLEMENT_MODE', 'batch')
+REWARD_BATCH_SIZE = int(os.getenv('REWARD_BATCH_SIZE', 500))
+REWARD_WORKERS = int(os.getenv('REWARD_WORKERS', 1))  # параллельные воркеры начисления в процессе
+# 1 — одно сообщение-сводка на пользователя за проход, 0 — сообщение на каждую награду
+REWARD_NOTIFY_DIGEST = bool(int(os.getenv('REWARD_NOTIFY_DIGEST', 1)))
+
+# Outbox-уведомления: сколько сообщений в секунду отправлять (лимит Telegram ~30)
+OUTBOX_RATE_LIMIT = float(os.getenv('OUTBOX_RATE_LIMIT', 25))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 8))
+
+# Выбор лидера через Redis: фоновые циклы работают только в одном процессе бота
+LEADER_ELECTION = bool(int(os.getenv('LEADER_ELECTION', 1)))
+LEADER_LEASE_SECONDS = int(os.getenv('LEADER_LEASE_SECONDS', 15))
+
+# Периодические задачи (планировщик работает только на лидере)
+BACKUP_CRON_HOUR = int(os.getenv('BACKUP_CRON_HOUR', 4))  # -1 — не делать бэкап из бота
+STATS_ROLLUP_INTERVAL = int(os.getenv('STATS_ROLLUP_INTERVAL', 300))  # секунды
+CACHE_WARMUP_INTERVAL = int(os.getenv('CACHE_WARMUP_INTERVAL', 3600))  # секунды
+LEDGER_SNAPSHOT_INTERVAL = int(os.getenv('LEDGER_SNAPSHOT_INTERVAL', 3600))  # секунды
+# Завершённые награды старше N дней переносятся в помесячный архив
+REWARD_ARCHIVE_DAYS = int(os.getenv('REWARD_ARCHIVE_DAYS', 30))
+REWARD_ARCHIVE_BATCH = int(os.getenv('REWARD_ARCHIVE_BATCH', 5000))
+# Как часто переносить last_active и другие отметки активности из Redis в БД
+TOUCH_FLUSH_INTERVAL = int(os.getenv('TOUCH_FLUSH_INTERVAL', 60))  # секунды
+# Закрытие заданий с набранной квотой и уведомление владельцев
+TASK_QUOTA_SWEEP_INTERVAL = int(os.getenv('TASK_QUOTA_SWEEP_INTERVAL', 300))  # секунды
+# Фоновое обновление названий/типов каналов заданий в Redis
+CHAT_META_REFRESH_INTERVAL = int(os.getenv('CHAT_META_REFRESH_INTERVAL', 1800))  # секунды
@@ -0,0 +1,87 @@
+"""Monthly partitions and archival for completed pending rewards.
+
+Completed (and failed) rewards older than the retention window are moved
+from ``pending_rewards`` into ``pending_rewards_archive``, which is
+partitioned by ``scheduled_at`` month. The hot table keeps only recent rows,
+so the worker's ``(status, scheduled_at)`` index and the per-user task key
+lookups stay small. Old months can be detached or dropped as whole
+partitions.
+
+Functions are synchronous and meant for worker threads (``run_db``).
+"""
+from datetime import date, datetime
+
+from database.models import db, PendingReward, PendingRewardArchive
+
+_ARCHIVE_COLUMNS = (
+    "id, user_id, task_key, task_title, diamonds, status, completed_at, scheduled_at, created_at"
+)
+
+
+def _month_start(moment: date) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PendingRewardArchive._meta.table_name}_{month:%Y%m}"
+
+
+def ensure_partitions(since: date, months_ahead: int = 2) -> list[str]:
+    """Create monthly archive partitions from ``since`` up to ``months_ahead`` months from now."""
+    parent = PendingRewardArchive._meta.table_name
+    month = _month_start(since)
+    last = _month_start(date.today())
+    for _ in range(months_ahead):
+        last = _next_month(last)
+
+    created = []
+    while month <= last:
+        name = partition_name(month)
+        db.execute_sql(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{parent}" '
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+        )
+        created.append(name)
+        month = _next_month(month)
+    return created
+
+
+def archive_batch(older_than: datetime, limit: int) -> int:
+    """Move up to ``limit`` settled rewards scheduled before ``older_than``. Returns rows moved."""
+    oldest = (PendingReward
+              .select(PendingReward.scheduled_at)
+              .where(
+                  PendingReward.status.in_(["completed", "failed"]) &
+                  (PendingReward.scheduled_at < older_than)
+              )
+              .order_by(PendingReward.scheduled_at)
+              .limit(1)
+              .scalar())
+    if oldest is None:
+        return 0
+
+    with db.atomic():
+        ensure_partitions(oldest.date())
+        cursor = db.execute_sql(
+            f"""
+            WITH moved AS (
+                DELETE FROM "{PendingReward._meta.table_name}"
+                WHERE id IN (
+                    SELECT id FROM "{PendingReward._meta.table_name}"
+                    WHERE status IN ('completed', 'failed') AND scheduled_at < %s
+                    ORDER BY scheduled_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING {_ARCHIVE_COLUMNS}
+            )
+            INSERT INTO "{PendingRewardArchive._meta.table_name}" ({_ARCHIVE_COLUMNS}, archived_at)
+            SELECT {_ARCHIVE_COLUMNS}, %s FROM moved
+            """,
+            (older_than, limit, datetime.now()),
+        )
+        return cursor.rowcount
@@ -38,7 +38,12 @@ def backup_database():
 
     except subprocess.CalledProcessError as e:
         print(f"❌ Ошибка бэкапа: {e.stderr}")
-        sys.exit(1)
+        raise RuntimeError(f"pg_dump failed: {e.stderr}") from e
+
+    return dump_file
 
 if __name__ == "__main__":
-    backup_database()
\ No newline at end of file
+    try:
+        backup_database()
+    except RuntimeError:
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""Server-side claim and quota close-out of local (channel subscription) tasks.
+
+``claim_local_task`` does the whole claim in one statement: a chain of
+data-modifying CTEs locks the task row, inserts the subscription (the unique
+user/channel index is the dedupe check), bumps the task's subscriber counter
+and inserts the pending reward, all only if the subscription row was new.
+Two taps on "check" race on the same unique index, so exactly one of them
+wins. The claim that fills the quota deactivates the task in the same
+UPDATE; ``close_filled_tasks`` later tells the owner. A task with a NULL
+``target_subscribers`` (added by an admin) has no quota and never closes.
+
+Functions are synchronous and meant for worker threads (``run_db``).
+"""
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from database.models import db, Task, UserSubscriptions, PendingReward, PendingRewardArchive
+from database.outbox import Notice, enqueue_notice
+
+CLAIMED = "claimed"
+ALREADY_CLAIMED = "already_claimed"
+TASK_UNAVAILABLE = "task_unavailable"
+
+_CLAIM_SQL = f"""
+WITH task AS (
+    SELECT id, reward FROM "{Task._meta.table_name}"
+    WHERE id = %(task_id)s AND is_active
+      AND (target_subscribers IS NULL OR current_subscribers < target_subscribers)
+    FOR UPDATE
+),
+sub AS (
+    INSERT INTO "{UserSubscriptions._meta.table_name}" (user_id, channel_id, timestamp)
+    SELECT %(user_id)s, %(channel_id)s, %(now)s FROM task
+    ON CONFLICT (user_id, channel_id) DO NOTHING
+    RETURNING id
+),
+bump AS (
+    UPDATE "{Task._meta.table_name}"
+    SET current_subscribers = current_subscribers + 1,
+        is_active = target_subscribers IS NULL OR current_subscribers + 1 < target_subscribers,
+        closed_at = CASE WHEN current_subscribers + 1 >= target_subscribers THEN %(now)s END
+    WHERE id = %(task_id)s AND EXISTS (SELECT 1 FROM sub)
+    RETURNING id
+),
+reward AS (
+    INSERT INTO "{PendingReward._meta.table_name}"
+        (user_id, task_key, task_title, diamonds, status, completed_at, scheduled_at, created_at)
+    SELECT %(user_id)s, %(task_key)s, %(task_title)s, task.reward, 'pending',
+           %(now)s, %(scheduled_at)s, %(now)s
+    FROM task
+    WHERE EXISTS (SELECT 1 FROM sub)
+      AND NOT EXISTS (
+          SELECT 1 FROM "{PendingRewardArchive._meta.table_name}"
+          WHERE user_id = %(user_id)s AND task_key = %(task_key)s
+      )
+    ON CONFLICT (user_id, task_key) DO NOTHING
+    RETURNING id, diamonds, scheduled_at
+)
+SELECT
+    EXISTS (SELECT 1 FROM task),
+    EXISTS (SELECT 1 FROM sub),
+    (SELECT id FROM reward),
+    (SELECT diamonds FROM reward),
+    (SELECT scheduled_at FROM reward),
+    EXISTS (
+        SELECT 1 FROM "{UserSubscriptions._meta.table_name}"
+        WHERE user_id = %(user_id)s AND channel_id = %(channel_id)s
+    )
+"""
+
+
+class ClaimResult(NamedTuple):
+    status: str
+    reward_id: Optional[int] = None
+    diamonds: int = 0
+    scheduled_at: Optional[datetime] = None
+
+
+def claim_local_task(
+    user_id: int,
+    task_id: int,
+    channel_id: int,
+    task_key: str,
+    task_title: str,
+    scheduled_at: datetime,
+) -> ClaimResult:
+    """Claim a local task for a user in a single round trip.
+
+    The reward amount is taken from the task row. ``reward_id`` is None when
+    the subscription was new but a reward for ``task_key`` already existed.
+    """
+    cursor = db.execute_sql(_CLAIM_SQL, {
+        "user_id": user_id,
+        "task_id": task_id,
+        "channel_id": channel_id,
+        "task_key": task_key,
+        "task_title": task_title,
+        "scheduled_at": scheduled_at,
+        "now": datetime.now(),
+    })
+    task_found, subscribed, reward_id, diamonds, reward_at, claimed_before = cursor.fetchone()
+    if not task_found:
+        # Задание закрыто квотой, но этот пользователь его уже выполнил
+        return ClaimResult(ALREADY_CLAIMED if claimed_before else TASK_UNAVAILABLE)
+    if not subscribed:
+        return ClaimResult(ALREADY_CLAIMED)
+    return ClaimResult(CLAIMED, reward_id, int(diamonds or 0), reward_at)
+
+
+def _quota_notice(task: Task) -> Notice:
+    return Notice(
+        task.owner_id,
+        f"✅ Задание на канал <code>{task.chat_id}</code> выполнено: "
+        f"{task.current_subscribers}/{task.target_subscribers} подписчиков.\n"
+        "Задание снято с показа.",
+    )
+
+
+def close_filled_tasks(limit: int = 100) -> int:
+    """Deactivate tasks whose quota is filled and queue a notice to their owners.
+
+    Tasks closed by a claim are only notified here; active tasks that reached
+    the quota some other way (older rows, manual edits) are closed too.
+    Returns the number of tasks handled.
+    """
+    now = datetime.now()
+    with db.atomic():
+        Task.update(is_active=False, closed_at=now).where(
+            Task.is_active &
+            Task.target_subscribers.is_null(False) &
+            (Task.current_subscribers >= Task.target_subscribers)
+        ).execute()
+        tasks = list(
+            Task.select()
+            .where(Task.closed_at.is_null(False) & Task.owner_notified_at.is_null())
+            .order_by(Task.closed_at)
+            .limit(limit)
+            .for_update("FOR UPDATE SKIP LOCKED")
+        )
+        if not tasks:
+            return 0
+        for task in tasks:
+            if task.owner_id:
+                enqueue_notice(_quota_notice(task))
+        Task.update(owner_notified_at=now).where(Task.id.in_([task.id for task in tasks])).execute()
+    return len(tasks)
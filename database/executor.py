@@ -0,0 +1,81 @@
+"""Bounded executor for blocking peewee queries.
+
+All DB work from handlers goes through ``run_db``: a dedicated thread pool
+keeps it off the event loop and away from the default executor, and a
+semaphore caps how many calls may be running or waiting. When the cap is
+reached callers wait up to ``DB_QUEUE_TIMEOUT`` seconds and then get
+``DatabaseBusy`` instead of piling up more work.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from database.models import db, is_pooled
+
+T = TypeVar("T")
+
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', 8))
+DB_QUEUE_LIMIT = int(os.getenv('DB_QUEUE_LIMIT', 100))  # выполняются + ждут потока
+DB_QUEUE_TIMEOUT = float(os.getenv('DB_QUEUE_TIMEOUT', 5))
+
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+_slots = asyncio.Semaphore(DB_QUEUE_LIMIT)
+_stats_lock = threading.Lock()
+_stats = {"in_flight": 0, "completed": 0, "shed": 0}
+
+
+class DatabaseBusy(Exception):
+    """Raised when the DB queue stays full longer than DB_QUEUE_TIMEOUT."""
+
+
+def _call(func: Callable[..., T], args: tuple, kwargs: dict) -> T:
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # Worker threads live longer than a single call: hand the pooled
+        # connection back so idle threads do not pin pool slots.
+        if is_pooled() and not db.is_closed() and not db.in_transaction():
+            db.close()
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Execute a blocking DB callable in the DB thread pool and await the result.
+
+    peewee keeps one connection per thread, so everything that must share a
+    transaction has to happen inside a single ``func`` call.
+    """
+    try:
+        await asyncio.wait_for(_slots.acquire(), DB_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        with _stats_lock:
+            _stats["shed"] += 1
+        raise DatabaseBusy(f"DB queue is full ({DB_QUEUE_LIMIT} calls)") from None
+
+    with _stats_lock:
+        _stats["in_flight"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(_call, func, args, kwargs))
+    finally:
+        _slots.release()
+        with _stats_lock:
+            _stats["in_flight"] -= 1
+            _stats["completed"] += 1
+
+
+def executor_stats() -> dict:
+    """Snapshot of the DB executor load."""
+    with _stats_lock:
+        return {
+            "workers": DB_EXECUTOR_WORKERS,
+            "queue_limit": DB_QUEUE_LIMIT,
+            **_stats,
+        }
+
+
+def shutdown_executor() -> None:
+    """Stop accepting DB work and wait for running calls to finish."""
+    _executor.shutdown(wait=True)
@@ -0,0 +1,77 @@
+"""Versioned in-process cache of the gift catalog and its exchange keyboard.
+
+The catalog only changes when an admin adds or deletes a gift (or
+``database/init.py`` reseeds it). Every change increments a version counter
+in Redis; each process keeps the active gifts and the prebuilt
+``InlineKeyboardMarkup`` for the version it loaded and reloads only when the
+counter moves. A view of the exchange screen therefore costs one Redis GET,
+no DB queries and no keyboard construction. Without Redis the catalog is
+loaded from the DB on every call, as before.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram.types import InlineKeyboardMarkup
+
+from database.executor import run_db
+from database.models import Gift
+from keyboards.keyboard import dynamic_gifts_keyboard
+from loader import redis_client
+
+logger = logging.getLogger(__name__)
+
+GIFT_CATALOG_VERSION_KEY = "gifts:catalog_version"
+
+
+def _load_active_gifts() -> list[Gift]:
+    return list(Gift.select().where(Gift.is_active == True))
+
+
+class GiftCatalog:
+    """Active gifts and their keyboard, cached per catalog version."""
+
+    def __init__(self, redis, key: str = GIFT_CATALOG_VERSION_KEY):
+        self._redis = redis
+        self._key = key
+        self._version: Optional[bytes] = None
+        self._gifts: list[Gift] = []
+        self._keyboard: Optional[InlineKeyboardMarkup] = None
+        self._lock = asyncio.Lock()
+
+    async def _current_version(self) -> Optional[bytes]:
+        try:
+            # Пустой счётчик (новый Redis) тоже версия: b"0"
+            return await self._redis.get(self._key) or b"0"
+        except Exception as e:
+            logger.warning(f"Версия каталога подарков недоступна: {e}")
+            return None
+
+    async def _reload(self, version: Optional[bytes]) -> tuple[list[Gift], InlineKeyboardMarkup]:
+        gifts = await run_db(_load_active_gifts)
+        keyboard = dynamic_gifts_keyboard(gifts)
+        if version is not None:
+            self._version, self._gifts, self._keyboard = version, gifts, keyboard
+        return gifts, keyboard
+
+    async def get(self) -> tuple[list[Gift], InlineKeyboardMarkup]:
+        """Active gifts and the exchange keyboard for them."""
+        version = await self._current_version()
+        if version is not None and version == self._version:
+            return self._gifts, self._keyboard
+        async with self._lock:
+            # Пока ждали блокировку, каталог мог загрузить другой запрос
+            if version is not None and version == self._version:
+                return self._gifts, self._keyboard
+            return await self._reload(version)
+
+    async def bump(self) -> None:
+        """Call after changing the gifts table: every process reloads on its next view."""
+        try:
+            await self._redis.incr(self._key)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить версию каталога подарков: {e}")
+        self._version = None
+
+
+gift_catalog = GiftCatalog(redis_client)
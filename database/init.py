@@ -1,12 +1,16 @@
+import asyncio
 import os
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from database.models import db, Root, Gift # type: ignore
+from database.migrations import run_migrations # type: ignore
+from database.gift_catalog import gift_catalog # type: ignore
 
 YOUR_TELEGRAM_ID = 6085231879
 
 def init_admin_and_gifts():
+    run_migrations()
     db.connect()
 
     Root.get_or_create(root_id=YOUR_TELEGRAM_ID)
@@ -44,6 +48,8 @@ def init_admin_and_gifts():
         )
 
     print(f"✅ Добавлено {len(GIFTS)} подарков.")
+    # Запущенные боты перезагрузят каталог при следующем показе
+    asyncio.run(gift_catalog.bump())
     db.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+"""Balance changes journaled in the append-only ``balance_ledger``.
+
+``users.balance`` stays the O(1) value every screen reads; each change to it
+is made here together with a ledger row in the same transaction, so the
+ledger always explains the balance. Snapshots fold old ledger rows into a
+per-user checkpoint, which keeps "balance by ledger" (snapshot + recent
+deltas) cheap to compute when auditing a user.
+
+The functions are synchronous and meant for worker threads (``run_db``);
+inside an outer ``db.atomic()`` they join its transaction.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from peewee import EXCLUDED, JOIN, Value, fn
+
+from database.models import db, User, BalanceLedger, BalanceSnapshot
+
+# Причины изменений баланса
+TASK_REWARD = "task_reward"
+REFERRAL_BONUS = "referral_bonus"
+TASK_PURCHASE = "task_purchase"
+GIFT_EXCHANGE = "gift_exchange"
+EXCHANGE_REFUND = "exchange_refund"
+MINIGAME_BET = "minigame_bet"
+MINIGAME_WIN = "minigame_win"
+MINIGAME_REFUND = "minigame_refund"
+FRAUD_PENALTY = "fraud_penalty"
+ADMIN = "admin"
+
+# Строки журнала моложе этого не попадают в снимок: их транзакция может быть ещё не закоммичена
+SNAPSHOT_SAFETY_MARGIN = timedelta(minutes=5)
+
+
+def record(user_id: int, delta: int, reason: str, ref: Optional[str] = None) -> None:
+    """Journal a balance change already applied to ``users``."""
+    if delta:
+        BalanceLedger.insert(user_id=user_id, delta=int(delta), reason=reason, ref=ref).execute()
+
+
+def change_balance(
+    user_id: int,
+    delta: int,
+    reason: str,
+    ref: Optional[str] = None,
+    require_funds: bool = False,
+) -> Optional[int]:
+    """Add ``delta`` to the balance and journal it.
+
+    With ``require_funds`` a debit only happens if the balance covers it.
+    Returns the new balance, or None if nothing changed.
+    """
+    condition = User.user_id == user_id
+    if require_funds:
+        condition &= User.balance >= -delta
+    with db.atomic():
+        rows = list(
+            User.update(balance=User.balance + int(delta))
+            .where(condition)
+            .returning(User.balance)
+            .tuples()
+            .execute()
+        )
+        if not rows:
+            return None
+        record(user_id, delta, reason, ref)
+    return int(rows[0][0])
+
+
+def change_balance_floor(user_id: int, delta: int, reason: str, ref: Optional[str] = None) -> Optional[int]:
+    """Like ``change_balance``, but never below zero; journals the actual change."""
+    with db.atomic():
+        row = User.select(User.balance).where(User.user_id == user_id).for_update().tuples().first()
+        if row is None:
+            return None
+        old_balance = int(row[0])
+        new_balance = max(0, old_balance + int(delta))
+        User.update(balance=new_balance).where(User.user_id == user_id).execute()
+        record(user_id, new_balance - old_balance, reason, ref)
+    return new_balance
+
+
+def ledger_balance(user_id: int) -> int:
+    """Balance reconstructed from the last snapshot and the deltas after it."""
+    snapshot = BalanceSnapshot.get_or_none(BalanceSnapshot.user_id == user_id)
+    base, after = (snapshot.balance, snapshot.ledger_id) if snapshot else (0, 0)
+    recent = (BalanceLedger
+              .select(fn.COALESCE(fn.SUM(BalanceLedger.delta), 0))
+              .where((BalanceLedger.user_id == user_id) & (BalanceLedger.id > after))
+              .scalar())
+    return int(base) + int(recent)
+
+
+def take_snapshots() -> int:
+    """Fold new ledger rows into per-user snapshots with one upsert.
+
+    Only rows older than ``SNAPSHOT_SAFETY_MARGIN`` are folded, so a row
+    whose transaction is still open cannot be skipped. Returns the number
+    of users whose snapshot moved.
+    """
+    cutoff = datetime.now() - SNAPSHOT_SAFETY_MARGIN
+    upto = (BalanceLedger
+            .select(BalanceLedger.id)
+            .where(BalanceLedger.created_at < cutoff)
+            .order_by(BalanceLedger.id.desc())
+            .limit(1)
+            .scalar())
+    if upto is None:
+        return 0
+    # Всё, что не выше максимального ledger_id, уже в снимках
+    done = BalanceSnapshot.select(fn.COALESCE(fn.MAX(BalanceSnapshot.ledger_id), 0)).scalar()
+    if upto <= done:
+        return 0
+
+    Snapshot = BalanceSnapshot.alias("s")
+    deltas = (BalanceLedger
+              .select(
+                  BalanceLedger.user_id,
+                  fn.COALESCE(Snapshot.balance, 0) + fn.SUM(BalanceLedger.delta),
+                  fn.MAX(BalanceLedger.id),
+                  Value(datetime.now()),
+              )
+              .join(Snapshot, JOIN.LEFT_OUTER, on=(Snapshot.user_id == BalanceLedger.user_id))
+              .where((BalanceLedger.id > done) & (BalanceLedger.id <= upto))
+              .group_by(BalanceLedger.user_id, Snapshot.balance))
+    return (BalanceSnapshot
+            .insert_from(deltas, fields=[
+                BalanceSnapshot.user_id,
+                BalanceSnapshot.balance,
+                BalanceSnapshot.ledger_id,
+                BalanceSnapshot.taken_at,
+            ])
+            .on_conflict(
+                conflict_target=[BalanceSnapshot.user_id],
+                update={
+                    BalanceSnapshot.balance: EXCLUDED.balance,
+                    BalanceSnapshot.ledger_id: EXCLUDED.ledger_id,
+                    BalanceSnapshot.taken_at: EXCLUDED.taken_at,
+                },
+            )
+            .as_rowcount()
+            .execute())
@@ -0,0 +1,189 @@
+"""Versioned schema migrations.
+
+Each migration runs once and is recorded in ``schema_migrations``. Runners in
+several processes are serialised with a Postgres advisory lock. Migrations
+marked ``transactional=False`` run in autocommit mode, which is what
+``CREATE INDEX CONCURRENTLY`` needs to build an index without blocking
+writes to a hot table.
+
+Run from the bot on start (``DB_MIGRATE_ON_START``) or by hand before a deploy:
+
+    python -m database.migrations
+"""
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Callable, NamedTuple
+
+from peewee import Value
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.models import (  # noqa: E402
+    db, User, Root, Task, UserSubscriptions, Gift, PendingReward, PendingRewardArchive,
+    OutboxMessage, BalanceLedger, BalanceSnapshot, SchemaMigration,
+)
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_KEY = 7_301_202_501  # произвольная константа для pg_advisory_lock
+# 1 — применять миграции при запуске бота, 0 — только вручную (python -m database.migrations)
+DB_MIGRATE_ON_START = bool(int(os.getenv('DB_MIGRATE_ON_START', 1)))
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[], None]
+    transactional: bool = True
+
+
+def create_index_concurrently(name: str, table: str, columns: list[str], where: str = "") -> None:
+    """Build an index without locking writes; an invalid leftover of a failed build is rebuilt.
+
+    ``where`` makes it a partial index.
+    """
+    invalid = db.execute_sql(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = %s AND NOT i.indisvalid",
+        (name,),
+    ).fetchone()
+    if invalid:
+        db.execute_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+    cols = ", ".join(f'"{column}"' for column in columns)
+    predicate = f" WHERE {where}" if where else ""
+    db.execute_sql(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ({cols}){predicate}')
+
+
+# ============================================================================
+# MIGRATIONS
+# ============================================================================
+
+def _initial_schema() -> None:
+    """Tables that used to be created by create_tables_safe() on every start."""
+    new_ledger = not BalanceLedger.table_exists()
+    db.create_tables([
+        User,
+        Root,
+        Task,
+        UserSubscriptions,
+        Gift,
+        PendingReward,
+        PendingRewardArchive,
+        OutboxMessage,
+        BalanceLedger,
+        BalanceSnapshot,
+    ], safe=True)
+    if new_ledger:
+        # Первая запись журнала для балансов, накопленных до его появления
+        BalanceLedger.insert_from(
+            User.select(User.user_id, User.balance, Value('opening'), Value(datetime.now()))
+            .where(User.balance != 0),
+            fields=[BalanceLedger.user_id, BalanceLedger.delta, BalanceLedger.reason, BalanceLedger.created_at],
+        ).execute()
+
+
+def _users_referral_active_index() -> None:
+    # Подсчёт активных/неактивных рефералов в профиле
+    create_index_concurrently("users_referral_is_active_referral", "users", ["referral", "is_active_referral"])
+
+
+def _subscriptions_user_channel_time_index() -> None:
+    # Проверка на фрод: подписки пары пользователь/канал за последние N часов
+    create_index_concurrently(
+        "user_subscriptions_user_id_channel_id_timestamp",
+        "user_subscriptions",
+        ["user_id", "channel_id", "timestamp"],
+    )
+
+
+def _referral_counters() -> None:
+    """Denormalised active/pending referral counters, backfilled from the referral links."""
+    db.execute_sql('ALTER TABLE "users" ADD COLUMN IF NOT EXISTS "active_referrals" INTEGER NOT NULL DEFAULT 0')
+    db.execute_sql('ALTER TABLE "users" ADD COLUMN IF NOT EXISTS "pending_referrals" INTEGER NOT NULL DEFAULT 0')
+    from database.referrals import reconcile_referral_counters
+    reconcile_referral_counters()
+
+
+def _task_quota_columns() -> None:
+    """Close-out timestamps for quota tasks; admin tasks (no owner) get no quota (NULL target)."""
+    db.execute_sql('ALTER TABLE "tasks" ADD COLUMN IF NOT EXISTS "closed_at" TIMESTAMP NULL')
+    db.execute_sql('ALTER TABLE "tasks" ADD COLUMN IF NOT EXISTS "owner_notified_at" TIMESTAMP NULL')
+    db.execute_sql('ALTER TABLE "tasks" ALTER COLUMN "target_subscribers" DROP NOT NULL')
+    db.execute_sql('ALTER TABLE "tasks" ALTER COLUMN "target_subscribers" DROP DEFAULT')
+    db.execute_sql('UPDATE "tasks" SET "target_subscribers" = NULL WHERE "owner_id" IS NULL')
+
+
+def _tasks_open_index() -> None:
+    # Список заданий для показа: только активные с незакрытой квотой или без квоты
+    create_index_concurrently(
+        "tasks_open_chat_id",
+        "tasks",
+        ["chat_id"],
+        where='"is_active" AND ("target_subscribers" IS NULL OR "current_subscribers" < "target_subscribers")',
+    )
+
+
+def _subscriptions_left_at() -> None:
+    """Departure time of users who left a channel they were credited for."""
+    db.execute_sql('ALTER TABLE "user_subscriptions" ADD COLUMN IF NOT EXISTS "left_at" TIMESTAMP NULL')
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "initial_schema", _initial_schema),
+    Migration(2, "users_referral_active_index", _users_referral_active_index, transactional=False),
+    Migration(3, "subscriptions_user_channel_time_index", _subscriptions_user_channel_time_index, transactional=False),
+    Migration(4, "referral_counters", _referral_counters),
+    Migration(5, "task_quota_columns", _task_quota_columns),
+    Migration(6, "tasks_open_index", _tasks_open_index, transactional=False),
+    Migration(7, "subscriptions_left_at", _subscriptions_left_at),
+]
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def pending_migrations() -> list[Migration]:
+    applied = {version for (version,) in SchemaMigration.select(SchemaMigration.version).tuples()}
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+def run_migrations() -> list[str]:
+    """Apply pending migrations in order. Returns the names applied by this call."""
+    applied = []
+    with db.connection_context():
+        db.execute_sql("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        try:
+            db.create_tables([SchemaMigration], safe=True)
+            for migration in pending_migrations():
+                logger.info(f"Миграция {migration.version}: {migration.name}...")
+                started = time.monotonic()
+                if migration.transactional:
+                    with db.atomic():
+                        migration.apply()
+                        _record(migration, started)
+                else:
+                    migration.apply()
+                    _record(migration, started)
+                applied.append(migration.name)
+        finally:
+            db.execute_sql("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+    return applied
+
+
+def _record(migration: Migration, started: float) -> None:
+    SchemaMigration.create(
+        version=migration.version,
+        name=migration.name,
+        duration_ms=round((time.monotonic() - started) * 1000),
+    )
+
+
+if __name__ == "__main__":
+    names = run_migrations()
+    for name in names:
+        print(f"✓ Миграция {name} применена")
+    print(f"✅ Применено миграций: {len(names)}" if names else "✅ Схема актуальна")
@@ -1,4 +1,6 @@
 import os
+import threading
+import time
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 from peewee import (
@@ -10,9 +12,13 @@ from peewee import (
     BooleanField,
     DateTimeField,
     AutoField,
+    BigAutoField,
     Check,
+    CompositeKey,
+    TextField,
     fn
 )
+from playhouse.pool import PooledPostgresqlDatabase, MaxConnectionsExceeded
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -26,9 +32,62 @@ if missing_vars:
         "Проверьте файл .env"
     )
 
+# Пул соединений: DB_POOL_MAX_CONNECTIONS > 0 включает пул, 0 — одно соединение на поток
+DB_POOL_MAX_CONNECTIONS = int(os.getenv('DB_POOL_MAX_CONNECTIONS', 0))
+DB_POOL_STALE_TIMEOUT = int(os.getenv('DB_POOL_STALE_TIMEOUT', 300))  # секунды жизни соединения
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 10))  # ожидание свободного соединения, секунды
+
+
+class InstrumentedPooledPostgresqlDatabase(PooledPostgresqlDatabase):
+    """
+    Пул соединений PostgreSQL со счётчиками выдач и времени ожидания.
+    Нужен, чтобы подбирать размер пула под max_connections при нескольких процессах бота.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def connect(self, reuse_if_open=False):
+        started = time.monotonic()
+        try:
+            opened = super().connect(reuse_if_open)
+        except MaxConnectionsExceeded:
+            with self._stats_lock:
+                self._timeouts += 1
+            raise
+        if opened:
+            waited = time.monotonic() - started
+            with self._stats_lock:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+        return opened
+
+    def stats(self) -> dict:
+        """Снимок состояния пула."""
+        with self._pool_lock:
+            in_use = len(self._in_use)
+            idle = len(self._connections)
+        with self._stats_lock:
+            checkouts = self._checkouts
+            return {
+                "max_connections": self._max_connections,
+                "in_use": in_use,
+                "idle": idle,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "wait_avg_ms": round(self._wait_total / checkouts * 1000, 2) if checkouts else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 2),
+            }
+
+
 # Инициализация подключения к БД
-db = PostgresqlDatabase(
-    os.getenv('DB_NAME', 'stars_bot'),
+_db_params = dict(
     user=os.getenv('DB_USER', 'stars_user'),
     password=os.getenv('DB_PASSWORD'),  # Теперь точно существует
     host=os.getenv('DB_HOST', 'localhost'),
@@ -37,6 +96,53 @@ db = PostgresqlDatabase(
     autoconnect=True
 )
 
+if DB_POOL_MAX_CONNECTIONS > 0:
+    db = InstrumentedPooledPostgresqlDatabase(
+        os.getenv('DB_NAME', 'stars_bot'),
+        max_connections=DB_POOL_MAX_CONNECTIONS,
+        stale_timeout=DB_POOL_STALE_TIMEOUT,
+        timeout=DB_POOL_TIMEOUT,
+        **_db_params
+    )
+else:
+    db = PostgresqlDatabase(os.getenv('DB_NAME', 'stars_bot'), **_db_params)
+
+# Реплика только для чтения (статистика, топы, выгрузки). DB_REPLICA_HOST пустой — реплики нет.
+# Остальные параметры по умолчанию как у основной БД.
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST', '')
+if DB_REPLICA_HOST:
+    _replica_params = dict(
+        _db_params,
+        host=DB_REPLICA_HOST,
+        port=int(os.getenv('DB_REPLICA_PORT', _db_params['port'])),
+        user=os.getenv('DB_REPLICA_USER', _db_params['user']),
+        password=os.getenv('DB_REPLICA_PASSWORD', _db_params['password']),
+        connect_timeout=int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', 3)),
+    )
+    _replica_name = os.getenv('DB_REPLICA_NAME', os.getenv('DB_NAME', 'stars_bot'))
+    if DB_POOL_MAX_CONNECTIONS > 0:
+        replica_db = InstrumentedPooledPostgresqlDatabase(
+            _replica_name,
+            max_connections=DB_POOL_MAX_CONNECTIONS,
+            stale_timeout=DB_POOL_STALE_TIMEOUT,
+            timeout=DB_POOL_TIMEOUT,
+            **_replica_params
+        )
+    else:
+        replica_db = PostgresqlDatabase(_replica_name, **_replica_params)
+else:
+    replica_db = None
+
+
+def is_pooled() -> bool:
+    """Работает ли БД через пул соединений."""
+    return isinstance(db, InstrumentedPooledPostgresqlDatabase)
+
+
+def pool_stats() -> dict:
+    """Статистика пула соединений (пустой словарь, если пул выключен)."""
+    return db.stats() if is_pooled() else {}
+
 
 class User(Model):
     """
@@ -54,8 +160,11 @@ class User(Model):
     task_count = IntegerField(default=0)
     task_count_diamonds = IntegerField(default=0)
     can_exchange = BooleanField(default=False)
-    referrals_count = IntegerField(default=0, index=True)
+    referrals_count = IntegerField(default=0, index=True)  # Всего приглашённых (active + pending)
     is_active_referral = BooleanField(default=False, index=True)
+    # Счётчики рефералов этого пользователя, поддерживаются при записи (сверяются задачей referral_counters)
+    active_referrals = IntegerField(default=0)
+    pending_referrals = IntegerField(default=0)
 
     class Meta:
         database = db
@@ -85,8 +194,10 @@ class Task(Model):
     is_active = BooleanField(default=True, index=True)
     created_at = DateTimeField(default=lambda: datetime.now(timezone.utc))
     owner_id = BigIntegerField(null=True, index=True)  # user_id создателя задания
-    target_subscribers = IntegerField(default=1)
+    target_subscribers = IntegerField(null=True)  # NULL — без квоты (задания, добавленные админом)
     current_subscribers = IntegerField(default=0)
+    closed_at = DateTimeField(null=True)  # Квота набрана, задание снято с показа
+    owner_notified_at = DateTimeField(null=True)  # Владельцу отправлено уведомление о завершении
 
     class Meta:
         database = db
@@ -101,6 +212,7 @@ class UserSubscriptions(Model):
     user_id = BigIntegerField(index=True)
     channel_id = BigIntegerField(index=True)  # Не CharField! ID канала — число
     timestamp = DateTimeField(default=lambda: datetime.now(timezone.utc))
+    left_at = DateTimeField(null=True)  # Отписался от канала после зачёта (NULL — подписан или неизвестно)
 
     class Meta:
         database = db
@@ -151,42 +263,105 @@ class PendingReward(Model):
         )
 
 
-def create_tables_safe():
+class PendingRewardArchive(Model):
+    """
+    Архив завершённых наград, секционированный по месяцам scheduled_at.
+    Строки переносятся из pending_rewards фоновой задачей, секции создаются ею же заранее.
+    Нужен, чтобы горячая таблица и её индексы содержали только свежие награды.
+    """
+    id = BigIntegerField()  # id из pending_rewards
+    user_id = BigIntegerField()
+    task_key = CharField()
+    task_title = CharField(null=True)
+    diamonds = IntegerField()
+    status = CharField()
+    completed_at = DateTimeField(null=True)
+    scheduled_at = DateTimeField()
+    created_at = DateTimeField(null=True)
+    archived_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        table_name = 'pending_rewards_archive'
+        primary_key = CompositeKey('id', 'scheduled_at')  # Ключ секционирования обязан входить в PK
+        table_settings = ['PARTITION BY RANGE (scheduled_at)']
+        indexes = (
+            (('user_id', 'task_key'), False),  # Проверка «задание уже выполнено»
+        )
+
+
+class OutboxMessage(Model):
+    """
+    Исходящие уведомления (transactional outbox).
+    Пишутся в той же транзакции, что и изменение баланса; отправляет их отдельный воркер
+    с повторами и ограничением скорости, поэтому хендлеры не ждут Telegram.
+    """
+    id = AutoField()
+    chat_id = BigIntegerField()
+    text = TextField()
+    parse_mode = CharField(null=True)  # None — parse_mode бота по умолчанию (HTML)
+    reply_markup = TextField(null=True)  # JSON InlineKeyboardMarkup
+    status = CharField(
+        default="pending",
+        constraints=[Check("status IN ('pending', 'sent', 'failed')")]
+    )
+    attempts = IntegerField(default=0)
+    next_attempt_at = DateTimeField(default=datetime.now)  # Локальное время, как scheduled_at у наград
+    created_at = DateTimeField(default=datetime.now)
+    sent_at = DateTimeField(null=True)
+    last_error = TextField(null=True)
+
+    class Meta:
+        database = db
+        table_name = 'outbox'
+        indexes = (
+            (('status', 'next_attempt_at'), False),  # Выборка очереди отправителем
+        )
+
+
+class BalanceLedger(Model):
     """
-    Создаёт таблицы в базе данных, если они ещё не существуют.
-    Автоматически подключается к БД при необходимости.
+    Журнал изменений баланса (только вставки).
+    Каждое начисление и списание пишется сюда в той же транзакции, что и users.balance,
+    поэтому у любого изменения баланса есть причина.
     """
-    if db.is_closed():
-        db.connect()
-    try:
-        db.create_tables([
-            User,
-            Root,
-            Task,
-            UserSubscriptions,
-            Gift,
-            PendingReward,
-        ], safe=True)
-        print("✓ Таблицы успешно созданы или уже существуют")
-    except Exception as e:
-        print(f"✗ Ошибка при создании таблиц: {e}")
-        raise
-    finally:
-        if not db.is_closed():
-            db.close()
+    id = BigAutoField()
+    user_id = BigIntegerField()
+    delta = BigIntegerField()  # + начисление, − списание
+    reason = CharField(max_length=32)  # task_reward, referral_bonus, gift_exchange, admin, ...
+    ref = CharField(null=True)  # ключ задания, id подарка и т.п.
+    created_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        table_name = 'balance_ledger'
+        indexes = (
+            (('user_id', 'id'), False),  # Дельты пользователя после снимка
+        )
 
 
-def initialize_database():
+class BalanceSnapshot(Model):
     """
-    Полная инициализация БД: подключение + создание таблиц.
-    Вызывайте эту функцию при старте бота.
+    Снимок баланса: сумма журнала пользователя до ledger_id включительно.
+    Баланс по журналу = balance + дельты с id > ledger_id.
     """
-    try:
-        create_tables_safe()
-        print(f"✓ База данных инициализирована: {os.getenv('DB_NAME')}")
-    except Exception as e:
-        print(f"✗ Критическая ошибка инициализации БД: {e}")
-        raise
+    user_id = BigIntegerField(primary_key=True)
+    balance = BigIntegerField(default=0)
+    ledger_id = BigIntegerField(default=0)
+    taken_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        table_name = 'balance_snapshots'
 
 
-initialize_database()
\ No newline at end of file
+class SchemaMigration(Model):
+    """Применённые миграции схемы (см. database/migrations.py)."""
+    version = IntegerField(primary_key=True)
+    name = CharField()
+    applied_at = DateTimeField(default=datetime.now)
+    duration_ms = IntegerField(default=0)
+
+    class Meta:
+        database = db
+        table_name = 'schema_migrations'
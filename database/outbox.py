@@ -0,0 +1,46 @@
+"""Transactional outbox: queue Telegram messages alongside DB changes."""
+from typing import Any, NamedTuple, Optional
+
+from database.models import OutboxMessage
+
+
+class Notice(NamedTuple):
+    """A message to queue together with a DB change."""
+    chat_id: int
+    text: str
+    parse_mode: Optional[str] = None
+    reply_markup: Any = None
+
+
+def enqueue_message(
+    chat_id: int,
+    text: str,
+    parse_mode: Optional[str] = None,
+    reply_markup=None,
+) -> OutboxMessage:
+    """Queue a message for the outbox sender.
+
+    Call it inside the same ``db.atomic()`` block as the change it reports,
+    so the notification is stored if and only if the change commits.
+    ``reply_markup`` is an aiogram markup object and is stored as JSON.
+    """
+    return OutboxMessage.create(
+        chat_id=chat_id,
+        text=text,
+        parse_mode=parse_mode,
+        reply_markup=reply_markup.model_dump_json(exclude_none=True) if reply_markup else None,
+    )
+
+
+def enqueue_notice(notice: Notice) -> OutboxMessage:
+    """``enqueue_message`` for a prepared :class:`Notice`."""
+    return enqueue_message(*notice)
+
+
+def enqueue_messages(messages: list[tuple[int, str]], parse_mode: Optional[str] = None) -> int:
+    """Queue many (chat_id, text) messages with a single INSERT."""
+    if not messages:
+        return 0
+    return OutboxMessage.insert_many(
+        [{"chat_id": chat_id, "text": text, "parse_mode": parse_mode} for chat_id, text in messages]
+    ).as_rowcount().execute()
@@ -0,0 +1,86 @@
+"""Denormalised referral counters on the referrer's ``users`` row.
+
+``active_referrals`` and ``pending_referrals`` are changed in the same
+transaction as the event that moves them (registration, activation), so
+the profile reads them with a primary-key lookup instead of counting
+``users WHERE referral = ?``. ``referrals_count`` is their sum.
+``reconcile_referral_counters`` repairs any drift with two set-based
+UPDATEs (a registration racing with it can leave a one-off error that the
+next run fixes). Functions are synchronous and meant for worker threads.
+"""
+from peewee import Case, fn
+
+from database.models import db, User
+
+
+def on_referral_registered(referrer_id: int) -> int:
+    """A new user joined through ``referrer_id``. Returns rows updated (0 if unknown)."""
+    return User.update(
+        pending_referrals=User.pending_referrals + 1,
+        referrals_count=User.referrals_count + 1,
+    ).where(User.user_id == referrer_id).execute()
+
+
+def attach_referral(user_id: int, referrer_id: int) -> bool:
+    """Set the referrer of an existing user who has none and count the registration.
+
+    ``referral IS NULL`` in the UPDATE makes concurrent ``/start`` calls
+    attach (and count) at most once. Returns whether the referral was set.
+    """
+    with db.atomic():
+        attached = User.update(referral=referrer_id).where(
+            (User.user_id == user_id) & User.referral.is_null()
+        ).execute()
+        if attached:
+            on_referral_registered(referrer_id)
+    return bool(attached)
+
+
+def activation_counter_updates() -> dict:
+    """Column changes for the referrer when one of its referrals becomes active."""
+    return {
+        User.active_referrals: User.active_referrals + 1,
+        User.pending_referrals: fn.GREATEST(User.pending_referrals - 1, 0),
+    }
+
+
+def reconcile_referral_counters() -> int:
+    """Recount the counters from ``users.referral`` and fix rows that drifted.
+
+    Returns the number of corrected rows.
+    """
+    Referral = User.alias("r")
+    counts = (Referral
+              .select(
+                  Referral.referral.alias("referrer_id"),
+                  fn.COUNT(Case(None, [(Referral.is_active_referral == True, 1)])).alias("active"),
+                  fn.COUNT(Case(None, [(Referral.is_active_referral == False, 1)])).alias("pending"),
+              )
+              .where(Referral.referral.is_null(False))
+              .group_by(Referral.referral)
+              .alias("counts"))
+    fixed = (User
+             .update({
+                 User.active_referrals: counts.c.active,
+                 User.pending_referrals: counts.c.pending,
+                 User.referrals_count: counts.c.active + counts.c.pending,
+             })
+             .from_(counts)
+             .where(
+                 (User.user_id == counts.c.referrer_id) &
+                 ((User.active_referrals != counts.c.active) |
+                  (User.pending_referrals != counts.c.pending) |
+                  (User.referrals_count != counts.c.active + counts.c.pending))
+             )
+             .execute())
+
+    # Пользователи, у которых рефералов не осталось
+    has_referrals = Referral.select(Referral.user_id).where(Referral.referral == User.user_id)
+    fixed += (User
+              .update(active_referrals=0, pending_referrals=0, referrals_count=0)
+              .where(
+                  ((User.active_referrals != 0) | (User.pending_referrals != 0) | (User.referrals_count != 0)) &
+                  ~fn.EXISTS(has_referrals)
+              )
+              .execute())
+    return fixed
@@ -0,0 +1,63 @@
+"""Routing of heavy read-only queries to the read replica.
+
+Read paths that tolerate a little replication lag (admin statistics, top
+lists, exports) call ``read_db``. It runs the function against
+``replica_db`` and falls back to the primary when no replica is configured
+or it is unreachable; a failed replica is skipped for
+``REPLICA_RETRY_AFTER`` seconds. Anything that reads its own writes must
+keep using ``run_db``.
+"""
+import logging
+import os
+import time
+from typing import Any, Callable
+
+from peewee import Database, InterfaceError, OperationalError
+
+from database.executor import run_db
+from database.models import db, replica_db, InstrumentedPooledPostgresqlDatabase
+
+logger = logging.getLogger(__name__)
+
+REPLICA_RETRY_AFTER = int(os.getenv('DB_REPLICA_RETRY_AFTER', 30))  # секунды без реплики после ошибки
+
+_replica_down_until = 0.0
+
+
+def replica_available() -> bool:
+    return replica_db is not None and time.monotonic() >= _replica_down_until
+
+
+def _read(func: Callable[..., Any], args: tuple) -> Any:
+    global _replica_down_until
+    if replica_available():
+        try:
+            return func(replica_db, *args)
+        except (OperationalError, InterfaceError) as e:
+            _replica_down_until = time.monotonic() + REPLICA_RETRY_AFTER
+            logger.warning(f"Реплика недоступна, читаем с основной БД {REPLICA_RETRY_AFTER} с: {e}")
+            try:
+                replica_db.close()
+            except Exception:
+                pass
+        finally:
+            # Как и у основной БД: соединение пула возвращается сразу после вызова
+            if isinstance(replica_db, InstrumentedPooledPostgresqlDatabase) and not replica_db.is_closed():
+                replica_db.close()
+    return func(db, *args)
+
+
+async def read_db(func: Callable[..., Any], *args) -> Any:
+    """Run ``func(database, *args)`` on the replica, or on the primary as a fallback."""
+    return await run_db(_read, func, args)
+
+
+# Готовые функции для read_db: await read_db(fetch_count, User.select())
+
+def fetch_all(database: Database, query) -> list:
+    """Materialise a SELECT."""
+    return list(query.execute(database))
+
+
+def fetch_count(database: Database, query) -> int:
+    return query.count(database)
@@ -0,0 +1,416 @@
+"""Awaitable data-access layer over the peewee models.
+
+Handlers should go through these coroutines instead of calling peewee on the
+event loop: every function runs its queries in a worker thread via
+``run_db`` and returns plain model instances or scalars. Functions that
+change a user's row also refresh that user's cached snapshot.
+"""
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterable, Optional
+
+from peewee import Expression, Field, Select, Value, fn
+
+from database import claims, ledger, referrals
+from database.executor import run_db
+from database.models import db, User, Task, UserSubscriptions, Gift, PendingReward, PendingRewardArchive
+from database.outbox import Notice, enqueue_notice
+from database.user_cache import user_cache, get_snapshot
+
+
+# ============================================================================
+# USERS
+# ============================================================================
+
+async def get_user(user_id: int) -> Optional[User]:
+    """Fetch a user by Telegram ID."""
+    return await run_db(User.get_or_none, User.user_id == user_id)
+
+
+async def user_exists(user_id: int) -> bool:
+    """Check whether a user row exists."""
+    return await run_db(User.select().where(User.user_id == user_id).exists)
+
+
+async def update_user(user_id: int, **fields) -> int:
+    """Update selected columns of a user without rewriting the whole row."""
+    updated = await run_db(User.update(**fields).where(User.user_id == user_id).execute)
+    await user_cache.invalidate(user_id)
+    return updated
+
+
+def _change_balance(
+    user_id: int,
+    delta: int,
+    reason: str,
+    ref: Optional[str],
+    notice: Optional[Notice],
+    require_funds: bool = False,
+) -> Optional[int]:
+    with db.atomic():
+        balance = ledger.change_balance(user_id, delta, reason, ref, require_funds=require_funds)
+        if balance is not None and notice:
+            enqueue_notice(notice)
+    return balance
+
+
+async def charge_balance(
+    user_id: int,
+    amount: int,
+    reason: str,
+    ref: Optional[str] = None,
+    notice: Optional[Notice] = None,
+) -> Optional[int]:
+    """Atomically debit ``amount`` if the balance covers it.
+
+    The debit is journaled under ``reason``; ``notice`` is queued in the
+    outbox only if the debit happened. Returns the new balance, or None
+    when the user is missing or short on funds.
+    """
+    balance = await run_db(_change_balance, user_id, -int(amount), reason, ref, notice, True)
+    if balance is not None:
+        await user_cache.invalidate(user_id)
+    return balance
+
+
+async def add_balance(
+    user_id: int,
+    amount: int,
+    reason: str,
+    ref: Optional[str] = None,
+    notice: Optional[Notice] = None,
+) -> Optional[int]:
+    """Atomically credit ``amount`` (journaled, with ``notice`` queued). Returns the new balance or None."""
+    balance = await run_db(_change_balance, user_id, int(amount), reason, ref, notice)
+    if balance is not None:
+        await user_cache.invalidate(user_id)
+    return balance
+
+
+async def increment_user_stats(
+    user_id: int,
+    balance: int = 0,
+    task_count: int = 0,
+    task_count_diamonds: int = 0,
+    reason: str = ledger.TASK_REWARD,
+    ref: Optional[str] = None,
+) -> Optional[User]:
+    """Atomically add to balance/task counters and return the updated user.
+
+    A balance change is journaled under ``reason``.
+    """
+    def _increment() -> Optional[User]:
+        with db.atomic():
+            rows = list(
+                User.update(
+                    balance=User.balance + int(balance),
+                    task_count=User.task_count + int(task_count),
+                    task_count_diamonds=User.task_count_diamonds + int(task_count_diamonds),
+                )
+                .where(User.user_id == user_id)
+                .returning(User)
+                .execute()
+            )
+            if rows:
+                ledger.record(user_id, int(balance), reason, ref)
+        return rows[0] if rows else None
+    user = await run_db(_increment)
+    if user:
+        await user_cache.invalidate(user_id)
+    return user
+
+
+async def get_balance(user_id: int) -> int:
+    """Current balance of a user for display (0 for unknown users), from the snapshot cache."""
+    snapshot = await get_snapshot(user_id)
+    return int(snapshot.balance) if snapshot else 0
+
+
+async def attach_referral(user_id: int, referrer_id: int) -> bool:
+    """Attach a late referral to an existing user and bump the referrer's counters."""
+    attached = await run_db(referrals.attach_referral, user_id, referrer_id)
+    if attached:
+        await user_cache.invalidate(user_id, referrer_id)
+    return attached
+
+
+async def count_referrals(user_id: int) -> tuple[int, int]:
+    """Return (active, inactive) referral counts from the user's counters."""
+    def _count() -> tuple[int, int]:
+        row = (User
+               .select(User.active_referrals, User.pending_referrals)
+               .where(User.user_id == user_id)
+               .tuples()
+               .first())
+        return (int(row[0]), int(row[1])) if row else (0, 0)
+    return await run_db(_count)
+
+
+async def iter_user_chunks(
+    *columns: Field,
+    chunk_size: int = 1000,
+    where: Optional[Expression] = None,
+) -> AsyncIterator[list[tuple]]:
+    """Walk the users table in ``user_id`` order, one chunk of tuples at a time.
+
+    Rows are ``(user_id, *columns)``. Pages are fetched by keyset
+    (``user_id > last``), so every page is an index range scan and only one
+    chunk is held in memory; use it for broadcasts, exports and bulk jobs.
+    """
+    last_id = None
+    while True:
+        query = User.select(User.user_id, *columns)
+        if where is not None:
+            query = query.where(where)
+        if last_id is not None:
+            query = query.where(User.user_id > last_id)
+        rows = await run_db(list, query.order_by(User.user_id).limit(chunk_size).tuples())
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+
+async def count_users(where: Optional[Expression] = None) -> int:
+    """Number of users, optionally filtered."""
+    query = User.select()
+    if where is not None:
+        query = query.where(where)
+    return await run_db(query.count)
+
+
+async def apply_fraud_penalty(user_id: int) -> None:
+    """Fine a user for a fraud attempt and drop their subscription history."""
+    def _penalize() -> None:
+        with db.atomic():
+            ledger.change_balance_floor(user_id, -10, ledger.FRAUD_PENALTY)
+            User.update(
+                task_count=fn.GREATEST(User.task_count - 5, 0),
+                task_count_diamonds=fn.GREATEST(User.task_count_diamonds - 5, 0),
+            ).where(User.user_id == user_id).execute()
+            UserSubscriptions.delete().where(UserSubscriptions.user_id == user_id).execute()
+    await run_db(_penalize)
+    await user_cache.invalidate(user_id)
+
+
+# ============================================================================
+# LOCAL TASKS & SUBSCRIPTIONS
+# ============================================================================
+
+async def get_user_channel_ids(user_id: int) -> set[int]:
+    """Channel IDs the user has already been credited for."""
+    def _get() -> set[int]:
+        return set(
+            cid for (cid,) in UserSubscriptions.select(
+                UserSubscriptions.channel_id
+            ).where(UserSubscriptions.user_id == user_id).tuples()
+            if cid is not None
+        )
+    return await run_db(_get)
+
+
+async def get_task(task_id: int, active_only: bool = True) -> Optional[Task]:
+    """Fetch a local task by ID."""
+    if active_only:
+        return await run_db(Task.get_or_none, Task.id == task_id, Task.is_active == True)
+    return await run_db(Task.get_or_none, Task.id == task_id)
+
+
+async def get_active_task_for_chat(chat_id: int) -> Optional[Task]:
+    """Active local task for a channel, if any."""
+    return await run_db(Task.get_or_none, (Task.chat_id == chat_id) & (Task.is_active == True))
+
+
+async def create_paid_task(
+    owner_id: int,
+    invite_link: str,
+    chat_id: int,
+    reward: int,
+    target_subscribers: int,
+    cost: int,
+    notice: Optional[Callable[[Task], Notice]] = None,
+) -> Optional[tuple[Task, int]]:
+    """Charge the owner and create a local task in one transaction.
+
+    ``notice`` builds an outbox message for the new task (e.g. a log entry).
+    Returns (task, new_balance), or None if the owner cannot afford it.
+    """
+    def _create() -> Optional[tuple[Task, int]]:
+        with db.atomic():
+            new_balance = ledger.change_balance(
+                owner_id, -cost, ledger.TASK_PURCHASE, str(chat_id), require_funds=True
+            )
+            if new_balance is None:
+                return None
+            task = Task.create(
+                invite_link=invite_link,
+                chat_id=chat_id,
+                reward=reward,
+                is_active=True,
+                owner_id=owner_id,
+                target_subscribers=target_subscribers,
+                current_subscribers=0,
+            )
+            if notice:
+                enqueue_notice(notice(task))
+            return task, new_balance
+    created = await run_db(_create)
+    if created:
+        await user_cache.invalidate(owner_id)
+    return created
+
+
+async def get_active_tasks(exclude_chat_ids: Iterable[int] = ()) -> list[Task]:
+    """Active local tasks with an unfilled (or no) quota, optionally skipping the given channels."""
+    query = Task.select().where(
+        Task.is_active &
+        (Task.target_subscribers.is_null() | (Task.current_subscribers < Task.target_subscribers))
+    )
+    exclude = list(exclude_chat_ids)
+    if exclude:
+        query = query.where(~Task.chat_id.in_(exclude))
+    return await run_db(list, query)
+
+
+async def has_subscription(user_id: int, channel_id: int) -> bool:
+    """Check whether the user was already credited for the channel."""
+    return await run_db(
+        UserSubscriptions.select().where(
+            (UserSubscriptions.user_id == user_id) &
+            (UserSubscriptions.channel_id == channel_id)
+        ).exists
+    )
+
+
+async def count_subscriptions_since(user_id: int, channel_id: int, since: datetime) -> int:
+    """Number of subscription records for the pair newer than ``since``."""
+    return await run_db(
+        UserSubscriptions.select().where(
+            (UserSubscriptions.user_id == user_id) &
+            (UserSubscriptions.channel_id == channel_id) &
+            (UserSubscriptions.timestamp > since)
+        ).count
+    )
+
+
+async def record_subscription(user_id: int, channel_id: int) -> bool:
+    """Store a user→channel subscription. Returns True if it was new."""
+    _, created = await run_db(
+        UserSubscriptions.get_or_create,
+        user_id=user_id,
+        channel_id=channel_id,
+        defaults={"timestamp": datetime.now()},
+    )
+    return created
+
+
+async def claim_local_task(
+    user_id: int,
+    task_id: int,
+    channel_id: int,
+    task_key: str,
+    task_title: str,
+    scheduled_at: datetime,
+) -> claims.ClaimResult:
+    """Record the subscription, bump the task counter and schedule its reward in one statement."""
+    return await run_db(
+        claims.claim_local_task, user_id, task_id, channel_id, task_key, task_title, scheduled_at
+    )
+
+
+async def set_subscription_left(user_id: int, channel_id: int, left_at: Optional[datetime]) -> int:
+    """Mark a credited subscription as left (``left_at``) or as rejoined (``None``)."""
+    return await run_db(
+        UserSubscriptions.update(left_at=left_at)
+        .where((UserSubscriptions.user_id == user_id) & (UserSubscriptions.channel_id == channel_id))
+        .execute
+    )
+
+
+async def increment_task_subscribers(task_id: int) -> int:
+    """Bump ``current_subscribers`` of a local task."""
+    return await run_db(
+        Task.update(current_subscribers=Task.current_subscribers + 1)
+        .where(Task.id == task_id).execute
+    )
+
+
+# ============================================================================
+# PENDING REWARDS
+# ============================================================================
+
+async def get_task_keys(user_id: int, prefix: str) -> set[str]:
+    """Task keys with the given prefix (e.g. 'flyer:') already recorded for the user.
+
+    Archived rewards count too, so an old task is never offered again.
+    """
+    def _get() -> set[str]:
+        hot = PendingReward.select(PendingReward.task_key).where(
+            (PendingReward.user_id == user_id) &
+            (PendingReward.task_key.startswith(prefix))
+        )
+        archived = PendingRewardArchive.select(PendingRewardArchive.task_key).where(
+            (PendingRewardArchive.user_id == user_id) &
+            (PendingRewardArchive.task_key.startswith(prefix))
+        )
+        return set(key for (key,) in (hot | archived).tuples() if key)
+    return await run_db(_get)
+
+
+async def get_pending_reward(user_id: int, task_key: str) -> Optional[PendingReward]:
+    """Fetch the reward row for a user/task pair."""
+    return await run_db(
+        PendingReward.get_or_none,
+        PendingReward.user_id == user_id,
+        PendingReward.task_key == task_key,
+    )
+
+
+async def create_pending_reward(
+    user_id: int,
+    task_key: str,
+    task_title: str,
+    diamonds: int,
+    scheduled_at: datetime,
+) -> Optional[PendingReward]:
+    """Schedule a delayed reward. Returns the new row, or None if it already existed.
+
+    One INSERT ... SELECT ... ON CONFLICT (user_id, task_key) DO NOTHING
+    RETURNING: rewards already moved to the archive count as existing, and
+    concurrent inserts of the same pair cannot both succeed.
+    """
+    now = datetime.now()
+    archived = PendingRewardArchive.select().where(
+        (PendingRewardArchive.user_id == user_id) &
+        (PendingRewardArchive.task_key == task_key)
+    )
+    query = (PendingReward
+             .insert_from(
+                 Select(columns=[
+                     Value(user_id), Value(task_key), Value(task_title), Value(int(diamonds)),
+                     Value("pending"), Value(now), Value(scheduled_at), Value(now),
+                 ]).where(~fn.EXISTS(archived)),
+                 fields=[
+                     PendingReward.user_id, PendingReward.task_key, PendingReward.task_title,
+                     PendingReward.diamonds, PendingReward.status, PendingReward.completed_at,
+                     PendingReward.scheduled_at, PendingReward.created_at,
+                 ],
+             )
+             .on_conflict(conflict_target=[PendingReward.user_id, PendingReward.task_key], action="IGNORE")
+             .returning(PendingReward))
+    def _create() -> Optional[PendingReward]:
+        rows = list(query.execute())
+        return rows[0] if rows else None
+    return await run_db(_create)
+
+
+# ============================================================================
+# GIFTS
+# ============================================================================
+
+async def get_gift(gift_id: int, active_only: bool = True) -> Optional[Gift]:
+    """Fetch a gift by ID."""
+    if active_only:
+        return await run_db(Gift.get_or_none, Gift.id == gift_id, Gift.is_active == True)
+    return await run_db(Gift.get_or_none, Gift.id == gift_id)
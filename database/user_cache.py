@@ -0,0 +1,151 @@
+"""Redis snapshot of the user fields shown on screens.
+
+Menus, the profile and the Mini App only display a user's balance, counters
+and flags, so they read ``get_snapshot`` instead of a point lookup on
+``users``. A snapshot is a Redis hash filled from the DB on a miss and kept
+for ``USER_CACHE_TTL`` seconds.
+
+Code that changes a user's row drops the snapshot after commit
+(``invalidate``); writers never put values into the cache, so two writes
+cannot land out of order. A read-through fill is guarded by a lease: before
+reading the row the reader puts a random token under ``<key>:fill``, and the
+snapshot is written only if that token is still there and no snapshot
+exists. ``invalidate`` deletes the lease too, so a fill that read the row
+before a concurrent write committed is discarded instead of caching the old
+balance. The TTL bounds staleness for writes that skip invalidation
+(set-based maintenance jobs). Snapshots are for display only: debits still
+check the balance in SQL.
+"""
+import logging
+import os
+import uuid
+from typing import NamedTuple, Optional
+
+from database.executor import run_db
+from database.models import User
+from loader import redis_client
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 300))  # секунды
+USER_CACHE_PREFIX = "user_snapshot:"
+FILL_LEASE_MS = 5000  # сколько читатель может заполнять снимок после промаха
+
+# Записать снимок, только если аренда ещё наша (не было записи в БД) и снимка нет
+_FILL_LUA = """
+if redis.call('GET', KEYS[2]) ~= ARGV[1] or redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('DEL', KEYS[2])
+return 1
+"""
+
+
+class UserSnapshot(NamedTuple):
+    user_id: int
+    username: Optional[str]
+    balance: int
+    referral: Optional[int]
+    boost: bool
+    task_count: int
+    task_count_diamonds: int
+    can_exchange: bool
+    is_active_referral: bool
+    active_referrals: int
+    pending_referrals: int
+
+
+SNAPSHOT_COLUMNS = tuple(getattr(User, name) for name in UserSnapshot._fields)
+
+
+def _key(user_id: int) -> str:
+    return f"{USER_CACHE_PREFIX}{user_id}"
+
+
+def _lease_key(user_id: int) -> str:
+    return f"{USER_CACHE_PREFIX}{user_id}:fill"
+
+
+def _encode(snapshot: UserSnapshot) -> dict[str, str]:
+    data = {}
+    for name, value in snapshot._asdict().items():
+        if value is None:
+            data[name] = ""
+        elif isinstance(value, bool):
+            data[name] = "1" if value else "0"
+        else:
+            data[name] = str(value)
+    return data
+
+
+def _decode(raw: dict) -> UserSnapshot:
+    data = {key.decode(): value.decode() for key, value in raw.items()}
+    return UserSnapshot(
+        user_id=int(data["user_id"]),
+        username=data["username"] or None,
+        balance=int(data["balance"]),
+        referral=int(data["referral"]) if data["referral"] else None,
+        boost=data["boost"] == "1",
+        task_count=int(data["task_count"]),
+        task_count_diamonds=int(data["task_count_diamonds"]),
+        can_exchange=data["can_exchange"] == "1",
+        is_active_referral=data["is_active_referral"] == "1",
+        active_referrals=int(data["active_referrals"]),
+        pending_referrals=int(data["pending_referrals"]),
+    )
+
+
+def _load(user_id: int) -> Optional[UserSnapshot]:
+    row = User.select(*SNAPSHOT_COLUMNS).where(User.user_id == user_id).tuples().first()
+    return UserSnapshot(*row) if row else None
+
+
+class UserCache:
+    """Read-through Redis hashes of ``UserSnapshot`` with lease-guarded fills."""
+
+    def __init__(self, redis, ttl: int = USER_CACHE_TTL):
+        self._redis = redis
+        self._ttl = ttl
+        self._fill = redis.register_script(_FILL_LUA)
+
+    async def get(self, user_id: int) -> Optional[UserSnapshot]:
+        """Snapshot from Redis, or from the DB (and cached unless a write raced) on a miss."""
+        token = uuid.uuid4().hex
+        try:
+            raw = await self._redis.hgetall(_key(user_id))
+            if raw:
+                return _decode(raw)
+            # Аренду берём до чтения из БД: запись, закоммиченная после, её удалит
+            await self._redis.set(_lease_key(user_id), token, px=FILL_LEASE_MS)
+        except Exception as e:
+            logger.warning(f"Кэш пользователей недоступен: {e}")
+            return await run_db(_load, user_id)
+
+        snapshot = await run_db(_load, user_id)
+        if snapshot:
+            fields = [item for pair in _encode(snapshot).items() for item in pair]
+            try:
+                await self._fill(keys=[_key(user_id), _lease_key(user_id)], args=[token, self._ttl, *fields])
+            except Exception as e:
+                logger.warning(f"Не удалось обновить кэш пользователя {user_id}: {e}")
+        return snapshot
+
+    async def invalidate(self, *user_ids: int) -> None:
+        """Drop snapshots and pending fills; call after the write has committed."""
+        if not user_ids:
+            return
+        keys = [key for user_id in user_ids for key in (_key(user_id), _lease_key(user_id))]
+        try:
+            await self._redis.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Не удалось сбросить кэш пользователей: {e}")
+
+
+user_cache = UserCache(redis_client)
+
+
+async def get_snapshot(user_id: int) -> Optional[UserSnapshot]:
+    """Display data of a user (balance, counters, flags), cached in Redis."""
+    return await user_cache.get(user_id)
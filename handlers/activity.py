@@ -0,0 +1,98 @@
+"""Write-behind buffer for per-user "touch" columns (last_active and the like).
+
+Handlers call ``touch(user_id)`` instead of updating the users row: the
+timestamp goes into a Redis hash (one per column, shared by all bot
+processes) and the maintenance job ``flush`` writes the whole hash back
+with one ``UPDATE ... FROM (VALUES ...)`` per chunk. A new touch column is
+one more entry in ``TOUCH_FIELDS``.
+
+A flush renames the hash first, so touches arriving meanwhile go to a fresh
+hash; if the DB write fails the renamed hash is kept and retried next time.
+"""
+import logging
+from datetime import datetime
+from typing import Optional
+
+from peewee import Field, ValuesList, fn
+
+from database.executor import run_db
+from database.models import User
+from loader import redis_client
+
+logger = logging.getLogger(__name__)
+
+TOUCH_KEY_PREFIX = "touch:"
+FLUSH_CHUNK = 1000
+
+# Колонки users, которые обновляются только через буфер
+TOUCH_FIELDS: dict[str, Field] = {
+    "last_active": User.last_active,
+}
+
+
+def _apply_touches(column: Field, rows: list[tuple[int, datetime]]) -> int:
+    """Bulk-update one touch column; a buffered value never moves it backwards."""
+    values = ValuesList(rows, columns=("user_id", "ts"), alias="t")
+    return (User
+            .update({column: fn.GREATEST(column, values.c.ts)})
+            .from_(values)
+            .where(User.user_id == values.c.user_id)
+            .execute())
+
+
+class TouchBuffer:
+    """Redis hashes of pending touches, flushed to Postgres in bulk."""
+
+    def __init__(self, redis, fields: dict[str, Field] = TOUCH_FIELDS, prefix: str = TOUCH_KEY_PREFIX):
+        self._redis = redis
+        self._fields = fields
+        self._prefix = prefix
+
+    def _key(self, field: str) -> str:
+        return f"{self._prefix}{field}"
+
+    async def touch(self, user_id: int, *fields: str, at: Optional[datetime] = None) -> None:
+        """Record activity of ``user_id`` for ``fields`` (default: last_active)."""
+        at = at or datetime.now()
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for field in fields or ("last_active",):
+                    if field not in self._fields:
+                        raise ValueError(f"Unknown touch field: {field}")
+                    pipe.hset(self._key(field), str(user_id), at.timestamp())
+                await pipe.execute()
+        except ValueError:
+            raise
+        except Exception as e:
+            # Активность не критична: без Redis просто теряем отметку
+            logger.warning(f"Не удалось записать активность {user_id}: {e}")
+
+    async def _flush_field(self, field: str) -> int:
+        key = self._key(field)
+        staging = f"{key}:flushing"
+        # Хвост неудачного прошлого сброса дописываем первым
+        if not await self._redis.exists(staging):
+            if not await self._redis.exists(key):
+                return 0
+            await self._redis.rename(key, staging)
+
+        raw = await self._redis.hgetall(staging)
+        rows = [(int(user_id), datetime.fromtimestamp(float(ts))) for user_id, ts in raw.items()]
+        updated = 0
+        for i in range(0, len(rows), FLUSH_CHUNK):
+            updated += await run_db(_apply_touches, self._fields[field], rows[i:i + FLUSH_CHUNK])
+        await self._redis.delete(staging)
+        return updated
+
+    async def flush(self) -> int:
+        """Write every buffered touch to the DB. Returns the number of updated rows."""
+        total = 0
+        for field in self._fields:
+            try:
+                total += await self._flush_field(field)
+            except Exception as e:
+                logger.exception(f"Ошибка сброса {field}: {e}")
+        return total
+
+
+touch_buffer = TouchBuffer(redis_client)
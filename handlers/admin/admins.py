@@ -4,7 +4,9 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from database.executor import run_db
 from database.models import Root
+from handlers.admin_cache import admin_cache
 from .core import is_admin, safe_edit_or_answer, back_kb, delete_keyboard
 
 logger = logging.getLogger(__name__)
@@ -55,7 +57,8 @@ async def add_admin_process(message: Message, state: FSMContext):
     
     try:
         admin_id = int(message.text.strip())
-        Root.get_or_create(root_id=admin_id)
+        await run_db(Root.get_or_create, root_id=admin_id)
+        await admin_cache.changed()
         logger.info(f"Admin {message.from_user.id} added admin {admin_id}")
         await message.answer(f"✅ Пользователь {admin_id} добавлен в админы.", reply_markup=back_kb())
     except ValueError:
@@ -71,12 +74,12 @@ async def remove_admin_start(call: CallbackQuery, state: FSMContext):
     if not is_admin(call.from_user.id):
         return
     
-    admins = list(Root.select())
+    admins = sorted(admin_cache.ids())
     if len(admins) <= 1:
         await call.answer("❌ Нельзя удалить последнего админа.", show_alert=True)
         return
     
-    admin_map = {str(a.root_id): str(a.root_id) for a in admins}
+    admin_map = {str(admin_id): str(admin_id) for admin_id in admins}
     keyboard = delete_keyboard(admin_map, prefix="deladmin_")
     await safe_edit_or_answer(call, "🗑 Выберите админа для удаления:", reply_markup=keyboard)
 
@@ -94,7 +97,8 @@ async def confirm_remove_admin(call: CallbackQuery):
             await call.answer("❌ Нельзя удалить самого себя.", show_alert=True)
             return
         
-        Root.delete().where(Root.root_id == admin_id).execute()
+        await run_db(Root.delete().where(Root.root_id == admin_id).execute)
+        await admin_cache.changed()
         logger.info(f"Admin {call.from_user.id} removed admin {admin_id}")
         await call.answer(f"✅ Админ {admin_id} удалён.", show_alert=True)
         await manage_admins_menu(call)
@@ -4,7 +4,10 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from database import ledger
+from database.executor import run_db
 from database.models import User
+from database.user_cache import user_cache
 from .core import is_admin, safe_edit_or_answer, back_kb
 
 logger = logging.getLogger(__name__)
@@ -110,28 +113,26 @@ async def process_diamond_change(message: Message, state: FSMContext):
     data = await state.get_data()
     user_id = data.get("user_id")
     action = data.get("action")
-    user = User.get_or_none(User.user_id == user_id)
+    admin_ref = str(message.from_user.id)
+    if action == "increase":
+        new_balance = await run_db(ledger.change_balance, user_id, diamonds, ledger.ADMIN, admin_ref)
+    else:
+        new_balance = await run_db(ledger.change_balance_floor, user_id, -diamonds, ledger.ADMIN, admin_ref)
     
-    if not user:
+    if new_balance is None:
         await message.answer("❌ Пользователь не найден.", reply_markup=back_kb())
         await state.clear()
         await message.delete()
         return
     
-    old_balance = user.balance
-    if action == "increase":
-        user.balance += diamonds
-    else:
-        user.balance = max(0, user.balance - diamonds)
-    
-    user.save()
+    await user_cache.invalidate(user_id)
     logger.info(
         f"Admin {message.from_user.id} changed balance for {user_id}: "
-        f"{old_balance} -> {user.balance} ({action} {diamonds})"
+        f"-> {new_balance} ({action} {diamonds})"
     )
     
     await message.answer(
-        f"✅ Баланс обновлён!\nID: {user_id}\nНовый баланс: {int(user.balance)} 💎",
+        f"✅ Баланс обновлён!\nID: {user_id}\nНовый баланс: {new_balance} 💎",
         reply_markup=back_kb()
     )
     
@@ -5,7 +5,7 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from database.models import User
+from database.repository import count_users, iter_user_chunks
 from loader import bot
 from .core import is_admin, safe_edit_or_answer, back_kb
 
@@ -129,33 +129,35 @@ async def confirm_broadcast(message: Message, state: FSMContext):
         return
     
     data = await state.get_data()
-    users = list(User.select())
+    total = await count_users()
     
-    if not users:
+    if not total:
         await message.answer("📭 Нет пользователей.", reply_markup=back_kb())
         await state.clear()
         await message.delete()
         return
     
     admin_id = message.from_user.id
-    total = len(users)
     logger.info(f"Admin {admin_id} started broadcast to {total} users")
     
     success = fail = 0
     progress = await message.answer(f"📨 0 / {total}")
     
-    for i, user in enumerate(users, 1):
-        try:
-            await bot.send_message(user.user_id, data["text"], reply_markup=data.get("button"))
-            success += 1
-        except Exception as e:
-            logger.debug(f"Failed to send to {user.user_id}: {e}")
-            fail += 1
-        
-        if i % 10 == 0 or i == total:
-            await progress.edit_text(f"📨 {success} / {total}\n❌ Ошибок: {fail}")
-        
-        await asyncio.sleep(0.05)
+    i = 0
+    async for chunk in iter_user_chunks(chunk_size=500):
+        for (user_id,) in chunk:
+            i += 1
+            try:
+                await bot.send_message(user_id, data["text"], reply_markup=data.get("button"))
+                success += 1
+            except Exception as e:
+                logger.debug(f"Failed to send to {user_id}: {e}")
+                fail += 1
+
+            if i % 10 == 0:
+                await progress.edit_text(f"📨 {success} / {total}\n❌ Ошибок: {fail}")
+
+            await asyncio.sleep(0.05)
     
     logger.info(f"Broadcast finished: {success} success, {fail} failed")
     await progress.edit_text(f"✅ Готово!\n✅ Успешно: {success}\n❌ Ошибок: {fail}")
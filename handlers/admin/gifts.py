@@ -4,6 +4,7 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from database.gift_catalog import gift_catalog
 from database.models import Gift
 from .core import is_admin, safe_edit_or_answer, back_kb, delete_keyboard
 
@@ -42,7 +43,7 @@ async def delete_gift_handler(call: CallbackQuery):
     if not is_admin(call.from_user.id):
         return
     
-    gifts = list(Gift.select().where(Gift.is_active == True))
+    gifts, _ = await gift_catalog.get()
     if not gifts:
         await safe_edit_or_answer(call, "📭 Нет подарков.", reply_markup=back_kb())
         return
@@ -62,6 +63,7 @@ async def confirm_delete_gift(call: CallbackQuery):
         gift_id = int(call.data.split("_")[1])
         gift = Gift.get_by_id(gift_id)
         gift.delete_instance()
+        await gift_catalog.bump()
         logger.info(f"Admin {call.from_user.id} deleted gift {gift_id}")
         await call.answer("✅ Удалено!", show_alert=True)
         await delete_gift_handler(call)
@@ -129,6 +131,7 @@ async def process_gift_cost(message: Message, state: FSMContext):
                 diamond_cost=cost,
                 is_active=True
             )
+            await gift_catalog.bump()
             logger.info(f"Admin {message.from_user.id} added gift: {name} ({cost} 💎)")
             await message.answer(f"✅ Подарок добавлен!\n{name} — {cost} 💎", reply_markup=back_kb())
         except Exception as e:
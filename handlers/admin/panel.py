@@ -3,7 +3,11 @@ import logging
 from datetime import datetime
 from aiogram import Router, F
 from aiogram.types import Message
-from database.models import User
+from database.executor import executor_stats
+from database.models import User, pool_stats
+from database.replica import read_db, fetch_count
+from handlers.jobs import jobs
+from handlers.maintenance import get_stats_rollup
 from handlers.utils import is_admin
 from handlers.admin.keyboards import admin_keyboard
 
@@ -19,9 +23,44 @@ async def admin_panel_button(message: Message) -> None:
         logger.warning(f"Unauthorized admin access attempt by user {message.from_user.id}")
         return
     
-    stats = (
-        f"🛠 <b>Админ-панель</b>\n\n"
-        f"👥 Пользователей: {User.select().count()}\n"
-        f"🆕 Сегодня: {User.select().where(User.date >= datetime.now().date()).count()}"
+    rollup = await get_stats_rollup()
+    if rollup:
+        stats = (
+            f"🛠 <b>Админ-панель</b>\n\n"
+            f"👥 Пользователей: {rollup['users']}\n"
+            f"🆕 Сегодня: {rollup['new_today']}\n"
+            f"⏳ Наград в очереди: {rollup['pending_rewards']}\n"
+            f"✉️ Уведомлений в очереди: {rollup['outbox_pending']} (ошибок: {rollup['outbox_failed']})\n"
+            f"<i>на {rollup['computed_at'].replace('T', ' ')}</i>"
+        )
+    else:
+        stats = (
+            f"🛠 <b>Админ-панель</b>\n\n"
+            f"👥 Пользователей: {await read_db(fetch_count, User.select())}\n"
+            f"🆕 Сегодня: {await read_db(fetch_count, User.select().where(User.date >= datetime.now().date()))}"
+        )
+    executor = executor_stats()
+    stats += (
+        f"\n\n⚙️ <b>Очередь БД:</b> {executor['in_flight']} в работе "
+        f"(потоков: {executor['workers']}, лимит: {executor['queue_limit']})\n"
+        f"Выполнено: {executor['completed']} | Отклонено: {executor['shed']}"
     )
+    pool = pool_stats()
+    if pool:
+        stats += (
+            f"\n🔌 <b>Пул БД:</b> {pool['in_use']}/{pool['max_connections']} "
+            f"(свободно: {pool['idle']})\n"
+            f"Выдач: {pool['checkouts']} | Таймаутов: {pool['timeouts']}\n"
+            f"Ожидание: ср. {pool['wait_avg_ms']} мс, макс. {pool['wait_max_ms']} мс"
+        )
+    job_lines = [
+        f"• {job['name']}: {job['runs']} зап., ср. {job['avg_ms']} мс, макс. {job['max_ms']} мс"
+        + (f", ошибок {job['failures']}" if job['failures'] else "")
+        + (f", пропусков {job['missed'] + job['skipped']}" if job['missed'] + job['skipped'] else "")
+        + (f", далее {job['next_run_at']:%H:%M}" if job['next_run_at'] else "")
+        for job in jobs.snapshot()
+        if job['runs'] or job['next_run_at']
+    ]
+    if job_lines:
+        stats += "\n\n🗓 <b>Фоновые задачи:</b>\n" + "\n".join(job_lines)
     await message.answer(stats, reply_markup=admin_keyboard(), parse_mode="HTML")
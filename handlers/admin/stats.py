@@ -4,6 +4,8 @@ from datetime import datetime, timedelta
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from database.models import User
+from database.replica import read_db, fetch_all, fetch_count
+from handlers.maintenance import get_stats_rollup
 from .core import is_admin, safe_edit_or_answer, format_number, back_kb
 import aiohttp
 from typing import Dict, Any
@@ -12,14 +14,14 @@ logger = logging.getLogger(__name__)
 router = Router()
 
 
-def get_user_stats() -> int:
+async def get_user_stats() -> int:
     """Get total users count."""
-    return User.select().count()
+    return await read_db(fetch_count, User.select())
 
 
-def get_boosted_users_count() -> int:
+async def get_boosted_users_count() -> int:
     """Get users with boost."""
-    return User.select().where(User.boost == True).count()
+    return await read_db(fetch_count, User.select().where(User.boost == True))
 
 
 async def get_subgram_statistics(api_key: str) -> Dict[str, Any]:
@@ -65,9 +67,13 @@ async def admin_handler(call: CallbackQuery):
         await call.answer("🚫 Доступ запрещён.", show_alert=True)
         return
     
-    user_count = get_user_stats()
-    boosted_users = get_boosted_users_count()
-    new_users_today = User.select().where(User.date >= datetime.now().date()).count()
+    rollup = await get_stats_rollup()
+    if rollup:
+        user_count, boosted_users, new_users_today = rollup["users"], rollup["boosted"], rollup["new_today"]
+    else:
+        user_count = await get_user_stats()
+        boosted_users = await get_boosted_users_count()
+        new_users_today = await read_db(fetch_count, User.select().where(User.date >= datetime.now().date()))
 
     msg = (
         f"📊 *Статистика*\n\n"
@@ -97,7 +103,8 @@ async def show_referral_stats(call: CallbackQuery):
         await call.answer("🚫 Доступ запрещён.", show_alert=True)
         return
 
-    top_users = (
+    top_users = await read_db(
+        fetch_all,
         User
         .select()
         .where(User.referrals_count > 0)
@@ -0,0 +1,84 @@
+"""In-process set of admin IDs, kept in sync across bot processes.
+
+``is_admin`` is called on every admin message and callback, so membership
+is answered from memory. The set is loaded from ``roots`` at startup and
+reloaded whenever the admin list changes: the process that changed it
+publishes on a Redis channel and every process (including itself) reloads.
+After a lost pub/sub connection the set is reloaded as well, so a change
+published in between is not missed.
+"""
+import asyncio
+import logging
+
+from database.executor import run_db
+from database.models import Root
+from loader import redis_client
+
+logger = logging.getLogger(__name__)
+
+ADMINS_CHANNEL = "admins:changed"
+RESUBSCRIBE_DELAY = 5  # секунды до переподключения к pub/sub
+
+
+def _load_admin_ids() -> frozenset[int]:
+    return frozenset(root_id for (root_id,) in Root.select(Root.root_id).tuples())
+
+
+class AdminCache:
+    """Admin IDs in memory, invalidated through Redis pub/sub."""
+
+    def __init__(self, redis, channel: str = ADMINS_CHANNEL):
+        self._redis = redis
+        self._channel = channel
+        self._ids: frozenset[int] = frozenset()
+        self._loaded = False
+
+    def contains(self, user_id: int) -> bool:
+        if not self._loaded:
+            # Запасной путь до первой загрузки (скрипты, тесты): один запрос к БД
+            self._set(_load_admin_ids())
+        return user_id in self._ids
+
+    def ids(self) -> frozenset[int]:
+        return self._ids
+
+    def _set(self, ids: frozenset[int]) -> None:
+        self._ids = ids
+        self._loaded = True
+
+    async def reload(self) -> None:
+        """Reload the set from the DB."""
+        self._set(await run_db(_load_admin_ids))
+
+    async def changed(self) -> None:
+        """Call after writing to ``roots``: reload here and notify other processes."""
+        await self.reload()
+        try:
+            await self._redis.publish(self._channel, "1")
+        except Exception as e:
+            logger.warning(f"Не удалось оповестить процессы о смене админов: {e}")
+
+    async def listen(self) -> None:
+        """Reload on every change notification; runs for the lifetime of the process."""
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self._channel)
+                # Изменения, пришедшие пока не были подписаны
+                await self.reload()
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Подписка на смену админов прервана: {e}")
+                await asyncio.sleep(RESUBSCRIBE_DELAY)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+admin_cache = AdminCache(redis_client)
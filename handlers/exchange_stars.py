@@ -1,10 +1,14 @@
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from database.models import User, Gift
-from keyboards.keyboard import dynamic_gifts_keyboard, back_button_keyboard
+from database import ledger
+from database.executor import run_db
+from database.outbox import Notice
+from database.gift_catalog import gift_catalog
+from database.repository import get_user, get_snapshot, get_gift, update_user, charge_balance, add_balance
+from keyboards.keyboard import back_button_keyboard
+from handlers.notifications import notify, wake_outbox
 from handlers.utils import is_admin, get_task_completion_count, get_referral_count
-from loader import bot
 from config import payment_chat as PAYMENT_CHAT_LINK, payment_chat_id as PAYMENT_CHAT_ID
 
 router = Router()
@@ -17,7 +21,7 @@ async def back_to_gifts(call: CallbackQuery):
 
 @router.callback_query(F.data == "exchange_stars")
 async def exchange_stars_menu(call: CallbackQuery):
-    user = User.get_or_none(User.user_id == call.from_user.id)
+    user = await get_snapshot(call.from_user.id)
     if not user:
         await call.answer("❌ Профиль не найден.", show_alert=True)
         return
@@ -32,23 +36,30 @@ async def exchange_stars_menu(call: CallbackQuery):
         "🎁 Выберите подарок для обмена:"
     )
 
-    gifts = list(Gift.select().where(Gift.is_active == True))
+    _, gifts_kb = await gift_catalog.get()
     try:
         await call.message.delete()
         await call.message.answer(
             text,
             parse_mode="HTML",
-            reply_markup=dynamic_gifts_keyboard(gifts)
+            reply_markup=gifts_kb
         )
     except Exception:
-        await call.message.edit_text(text, reply_markup=dynamic_gifts_keyboard(gifts), parse_mode="HTML")
+        await call.message.edit_text(text, reply_markup=gifts_kb, parse_mode="HTML")
     await call.answer()
 
 
+async def _answer_insufficient(call: CallbackQuery, cost: int, balance: int) -> None:
+    await call.answer(
+        f"❌ Недостаточно алмазов! Нужно {cost}, у вас {int(balance)}.",
+        show_alert=True
+    )
+
+
 @router.callback_query(F.data.startswith("gift:"))
 async def handle_gift_selection(call: CallbackQuery):
     user_id = call.from_user.id
-    user = User.get_or_none(User.user_id == user_id)
+    user = await get_user(user_id)
     if not user:
         await call.answer("❌ Пользователь не найден.", show_alert=True)
         return
@@ -59,15 +70,16 @@ async def handle_gift_selection(call: CallbackQuery):
         await call.answer("❗ Неверный формат подарка.", show_alert=True)
         return
 
-    gift = Gift.get_or_none(Gift.id == gift_id, Gift.is_active == True)
+    gift = await get_gift(gift_id)
     if not gift:
         await call.answer("🎁 Подарок недоступен.", show_alert=True)
         return
 
     # Проверка условий разблокировки
+    tasks_done = referrals = None
     if not user.can_exchange:
-        tasks_done = get_task_completion_count(user_id)
-        referrals = get_referral_count(user_id)
+        tasks_done = await run_db(get_task_completion_count, user_id)
+        referrals = await run_db(get_referral_count, user_id)
 
         if tasks_done < 10 or referrals < 3:
             errors = []
@@ -81,17 +93,47 @@ async def handle_gift_selection(call: CallbackQuery):
             )
             return
         user.can_exchange = True
-        user.save()
+        await update_user(user_id, can_exchange=True)
 
+    # Быстрый отказ без подсчётов; окончательно баланс проверяет списание
     if user.balance < gift.diamond_cost:
-        await call.answer(
-            f"❌ Недостаточно алмазов! Нужно {gift.diamond_cost}, у вас {int(user.balance)}.",
-            show_alert=True
-        )
+        await _answer_insufficient(call, gift.diamond_cost, user.balance)
         return
 
-    user.balance = int(user.balance) - int(gift.diamond_cost)
-    user.save()
+    # Заявка админам пишется в outbox вместе со списанием — не потеряется
+    full_name = call.from_user.full_name or "—"
+    username = call.from_user.username or "—"
+    if tasks_done is None:
+        tasks_done = await run_db(get_task_completion_count, user_id)
+        referrals = await run_db(get_referral_count, user_id)
+
+    admin_text = (
+        f"👤 <b>Пользователь:</b> <a href='tg://user?id={user_id}'>{full_name}</a> (@{username})\n"
+        f"👥 Рефералов: {referrals} | Заданий: {tasks_done}\n"
+        f"🎁 Подарок: {gift.display_name}\n"
+        f"💰 Стоимость: {gift.diamond_cost} 💎\n"
+        f"{'🟢 Обмен разблокирован' if user.can_exchange else '🟠 Обмен не разблокирован'}"
+    )
+
+    approve_btn = InlineKeyboardButton(
+        text="✅ Одобрить",
+        callback_data=f"approve_{user_id}_{gift.id}_{gift.diamond_cost}"
+    )
+    reject_btn = InlineKeyboardButton(
+        text="❌ Отклонить",
+        callback_data=f"reject_{user_id}_{gift.id}_{gift.diamond_cost}"
+    )
+    admin_kb = InlineKeyboardMarkup(inline_keyboard=[[approve_btn, reject_btn]])
+
+    request_notice = Notice(PAYMENT_CHAT_ID, admin_text, "HTML", admin_kb)
+    if await charge_balance(
+        user_id, int(gift.diamond_cost), ledger.GIFT_EXCHANGE, str(gift.id), notice=request_notice
+    ) is None:
+        # Баланс изменился после чтения — показываем актуальный
+        current = await get_user(user_id)
+        await _answer_insufficient(call, gift.diamond_cost, current.balance if current else 0)
+        return
+    wake_outbox()
 
     success_text = (
         f"🎉 <b>Поздравляем!</b>\n\n"
@@ -114,31 +156,6 @@ async def handle_gift_selection(call: CallbackQuery):
             reply_markup=back_button_keyboard()
         )
 
-    # Уведомление админов
-    full_name = call.from_user.full_name or "—"
-    username = call.from_user.username or "—"
-    tasks_done = get_task_completion_count(user_id)
-    referrals = get_referral_count(user_id)
-
-    admin_text = (
-        f"👤 <b>Пользователь:</b> <a href='tg://user?id={user_id}'>{full_name}</a> (@{username})\n"
-        f"👥 Рефералов: {referrals} | Заданий: {tasks_done}\n"
-        f"🎁 Подарок: {gift.display_name}\n"
-        f"💰 Стоимость: {gift.diamond_cost} 💎\n"
-        f"{'🟢 Обмен разблокирован' if user.can_exchange else '🟠 Обмен не разблокирован'}"
-    )
-
-    approve_btn = InlineKeyboardButton(
-        text="✅ Одобрить",
-        callback_data=f"approve_{user_id}_{gift.id}_{gift.diamond_cost}"
-    )
-    reject_btn = InlineKeyboardButton(
-        text="❌ Отклонить",
-        callback_data=f"reject_{user_id}_{gift.id}_{gift.diamond_cost}"
-    )
-    admin_kb = InlineKeyboardMarkup(inline_keyboard=[[approve_btn, reject_btn]])
-
-    await bot.send_message(PAYMENT_CHAT_ID, admin_text, reply_markup=admin_kb, parse_mode="HTML")
     await call.answer()
 
 
@@ -161,7 +178,7 @@ async def approve_exchange(call: CallbackQuery):
         await call.answer("⚠️ Ошибка данных.", show_alert=True)
         return
 
-    gift = Gift.get_or_none(Gift.id == gift_id)
+    gift = await get_gift(gift_id, active_only=False)
     gift_name = gift.display_name if gift else "Подарок"
 
     updated_text = call.message.text
@@ -174,7 +191,7 @@ async def approve_exchange(call: CallbackQuery):
         )
         await call.message.edit_text(updated_text, parse_mode="HTML")
 
-    await bot.send_message(
+    await notify(
         user_id,
         f"✅ Выплата за {cost} 💎 ({gift_name}) подтверждена!",
         reply_markup=back_button_keyboard()
@@ -200,14 +217,17 @@ async def reject_exchange(call: CallbackQuery):
         await call.answer("⚠️ Ошибка суммы.", show_alert=True)
         return
 
-    user = User.get_or_none(User.user_id == user_id)
-    if user:
-        user.balance = int(user.balance) + int(cost)
-        user.save()
-
-    gift = Gift.get_or_none(Gift.id == gift_id)
+    gift = await get_gift(gift_id, active_only=False)
     gift_name = gift.display_name if gift else "Подарок"
 
+    # Возврат и уведомление — одной транзакцией
+    await add_balance(user_id, int(cost), ledger.EXCHANGE_REFUND, str(gift_id), notice=Notice(
+        user_id,
+        f"❌ Выплата за {cost} 💎 ({gift_name}) отклонена. Алмазы возвращены.",
+        reply_markup=back_button_keyboard()
+    ))
+    wake_outbox()
+
     updated_text = call.message.text
     if updated_text:
         updated_text = (
@@ -216,10 +236,4 @@ async def reject_exchange(call: CallbackQuery):
             .replace("🟠", "🔴")
             .replace("🟢", "🔴")
         )
-        await call.message.edit_text(updated_text, parse_mode="HTML")
-
-    await bot.send_message(
-        user_id,
-        f"❌ Выплата за {cost} 💎 ({gift_name}) отклонена. Алмазы возвращены.",
-        reply_markup=back_button_keyboard()
-    )
\ No newline at end of file
+        await call.message.edit_text(updated_text, parse_mode="HTML")
\ No newline at end of file
@@ -0,0 +1,164 @@
+"""Registry of periodic background jobs on top of APScheduler.
+
+Every job is added through ``jobs.add`` so its schedule, concurrency limit
+and misfire policy live in one place, and every run is timed. Long-running
+loops that are not driven by APScheduler (reward settlement) report their
+passes through ``jobs.timed`` and show up in the same statistics.
+The scheduler itself runs only on the leader process (see handlers.leader).
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MISFIRE_GRACE = 60  # секунды: запуск, опоздавший сильнее, пропускается
+
+
+class JobStats:
+    """Run counters and durations of one job."""
+
+    def __init__(self) -> None:
+        self.runs = 0
+        self.failures = 0
+        self.missed = 0
+        self.skipped = 0  # не запущен: предыдущий запуск ещё идёт
+        self.running = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_duration = 0.0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_error: Optional[str] = None
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "missed": self.missed,
+            "skipped": self.skipped,
+            "running": self.running,
+            "last_started_at": self.last_started_at,
+            "last_ms": round(self.last_duration * 1000),
+            "avg_ms": round(self.total_duration / self.runs * 1000) if self.runs else 0,
+            "max_ms": round(self.max_duration * 1000),
+            "last_error": self.last_error,
+        }
+
+
+class JobRegistry:
+    """APScheduler wrapper that records how long every job takes."""
+
+    def __init__(self) -> None:
+        self._definitions: dict[str, tuple[Callable, str, bool, dict[str, Any]]] = {}
+        self._scheduler: Optional[AsyncIOScheduler] = None
+        self._stats: dict[str, JobStats] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._scheduler is not None and self._scheduler.running
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        trigger: str,
+        *,
+        max_instances: int = 1,
+        misfire_grace_time: int = DEFAULT_MISFIRE_GRACE,
+        run_at_start: bool = False,
+        **trigger_args,
+    ) -> None:
+        """Register an async job, e.g. ``add("backup", backup, "cron", hour=4)``.
+
+        ``run_at_start`` also runs the job as soon as the scheduler starts.
+        """
+        async def run() -> None:
+            try:
+                async with self.timed(name):
+                    await func()
+            except Exception:
+                pass  # уже записано и залогировано в timed()
+
+        self._stats.setdefault(name, JobStats())
+        self._definitions[name] = (run, trigger, run_at_start, {
+            "max_instances": max_instances,
+            "misfire_grace_time": misfire_grace_time,
+            **trigger_args,
+        })
+
+    @asynccontextmanager
+    async def timed(self, name: str):
+        """Record one run of ``name``; errors are counted and re-raised."""
+        stats = self._stats.setdefault(name, JobStats())
+        stats.running += 1
+        stats.last_started_at = datetime.now()
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            stats.failures += 1
+            stats.last_error = f"{type(e).__name__}: {e}"
+            logger.exception(f"Задача {name} завершилась с ошибкой: {e}")
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            stats.running -= 1
+            stats.runs += 1
+            stats.last_duration = duration
+            stats.total_duration += duration
+            stats.max_duration = max(stats.max_duration, duration)
+
+    def _on_missed(self, event) -> None:
+        stats = self._stats.setdefault(event.job_id, JobStats())
+        if event.code == EVENT_JOB_MISSED:
+            stats.missed += 1
+            logger.warning(f"Задача {event.job_id} пропущена: опоздание больше допустимого")
+        else:
+            stats.skipped += 1
+            logger.warning(f"Задача {event.job_id} не запущена: предыдущий запуск ещё идёт")
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        """Schedule and statistics of every known job."""
+        result = []
+        for name, stats in self._stats.items():
+            job = self._scheduler.get_job(name) if self.running else None
+            result.append({
+                "name": name,
+                "next_run_at": job.next_run_time if job else None,
+                **stats.as_dict(),
+            })
+        return result
+
+    async def run(self) -> None:
+        """Run the scheduler until cancelled (started as a leader singleton).
+
+        A fresh scheduler is built on every start, so the jobs come back
+        when this process regains leadership.
+        """
+        scheduler = AsyncIOScheduler(job_defaults={
+            "coalesce": True,  # пропущенные запуски схлопываются в один
+            "max_instances": 1,
+            "misfire_grace_time": DEFAULT_MISFIRE_GRACE,
+        })
+        scheduler.add_listener(self._on_missed, EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+        for name, (func, trigger, run_at_start, options) in self._definitions.items():
+            if run_at_start:
+                options = {**options, "next_run_time": datetime.now()}
+            scheduler.add_job(func, trigger, id=name, name=name, **options)
+
+        self._scheduler = scheduler
+        scheduler.start()
+        logger.info(f"Планировщик запущен: {', '.join(self._definitions)}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            scheduler.shutdown(wait=False)
+
+
+jobs = JobRegistry()
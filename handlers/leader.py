@@ -0,0 +1,139 @@
+"""Redis-lock leader election for singleton background loops.
+
+Every bot process runs ``leader.run()``. The process holding the
+``LEADER_KEY`` lock starts the registered singleton jobs and renews the
+lease every third of its length; the others keep trying to take the lock
+and pick the jobs up within one lease after the leader dies. A leader that
+cannot renew (Redis unreachable or hanging) stops its jobs before the lease
+can expire, so two processes never run them at the same time: every Redis
+call is bounded by half the renew interval, the lease is counted from when
+the renew was sent, and the leader steps down once two renew intervals of
+the lease are left.
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable
+
+from config import LEADER_ELECTION, LEADER_LEASE_SECONDS
+from loader import redis_client
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "bot:leader"
+JOB_RESTART_DELAY = 5
+
+# Продлить / снять блокировку, только если она всё ещё наша
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+JobFactory = Callable[[], Awaitable[None]]
+
+
+class LeaderElection:
+    """Runs singleton jobs only while this process holds the leader lease."""
+
+    def __init__(self, redis, key: str = LEADER_KEY, lease: int = LEADER_LEASE_SECONDS):
+        self._redis = redis
+        self._key = key
+        self._lease_ms = lease * 1000
+        self._renew_interval = lease / 3
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._renewed_at = 0.0
+        self._jobs: dict[str, JobFactory] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def singleton(self, name: str, factory: JobFactory) -> None:
+        """Register a coroutine factory to run on the leader only."""
+        self._jobs[name] = factory
+
+    async def run(self, enabled: bool = LEADER_ELECTION) -> None:
+        """Election loop. With ``enabled=False`` this process always leads."""
+        if not enabled:
+            self._become_leader()
+            return
+
+        loop = asyncio.get_running_loop()
+        # Зависший вызов не должен съесть аренду: ждём Redis не дольше половины интервала
+        timeout = self._renew_interval / 2
+        step_down_after = self._lease_ms / 1000 - 2 * self._renew_interval
+        while True:
+            try:
+                # Аренда отсчитывается не раньше момента отправки команды
+                sent_at = loop.time()
+                if self.is_leader:
+                    renewed = await asyncio.wait_for(
+                        self._redis.eval(_RENEW_SCRIPT, 1, self._key, self.identity, self._lease_ms),
+                        timeout,
+                    )
+                    if renewed:
+                        self._renewed_at = sent_at
+                    else:
+                        logger.warning("Лидерство потеряно: блокировку занял другой процесс")
+                        self._step_down()
+                elif await asyncio.wait_for(
+                    self._redis.set(self._key, self.identity, nx=True, px=self._lease_ms),
+                    timeout,
+                ):
+                    self._renewed_at = sent_at
+                    self._become_leader()
+            except Exception as e:
+                logger.warning(f"Выбор лидера: Redis недоступен: {e!r}")
+                # Останавливаемся раньше, чем истечёт аренда и лидером станет другой процесс
+                if self.is_leader and loop.time() - self._renewed_at >= step_down_after:
+                    self._step_down()
+            await asyncio.sleep(self._renew_interval)
+
+    async def release(self) -> None:
+        """Stop the jobs and hand the lock over immediately (on shutdown)."""
+        was_leader = self.is_leader
+        self._step_down()
+        if was_leader:
+            try:
+                await asyncio.wait_for(
+                    self._redis.eval(_RELEASE_SCRIPT, 1, self._key, self.identity),
+                    self._renew_interval / 2,
+                )
+            except Exception as e:
+                logger.warning(f"Не удалось снять блокировку лидера: {e}")
+
+    def _become_leader(self) -> None:
+        self.is_leader = True
+        logger.info(f"Процесс {self.identity} стал лидером, запускаю: {', '.join(self._jobs)}")
+        self._tasks = [
+            asyncio.create_task(self._supervise(name, factory), name=f"singleton:{name}")
+            for name, factory in self._jobs.items()
+        ]
+
+    def _step_down(self) -> None:
+        self.is_leader = False
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def _supervise(self, name: str, factory: JobFactory) -> None:
+        while True:
+            try:
+                await factory()
+                logger.warning(f"Фоновая задача {name} завершилась, перезапуск")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Фоновая задача {name} упала: {e}")
+            await asyncio.sleep(JOB_RESTART_DELAY)
+
+
+leader = LeaderElection(redis_client)
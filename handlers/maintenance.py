@@ -0,0 +1,170 @@
+"""Periodic maintenance jobs: backups, cache warmup, stats rollups, ledger snapshots,
+reward archival, referral counter reconciliation, activity flushes, task quota close-out
+and Telegram chat metadata refresh."""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from peewee import Case, Database, fn
+
+from config import (
+    BACKUP_CRON_HOUR, STATS_ROLLUP_INTERVAL, CACHE_WARMUP_INTERVAL, LEDGER_SNAPSHOT_INTERVAL,
+    REWARD_ARCHIVE_DAYS, REWARD_ARCHIVE_BATCH, TOUCH_FLUSH_INTERVAL, TASK_QUOTA_SWEEP_INTERVAL,
+    CHAT_META_REFRESH_INTERVAL,
+)
+from database import archive, claims, ledger, referrals
+from database.executor import run_db
+from database.replica import read_db
+from database.models import User, PendingReward, OutboxMessage, Task
+from handlers.activity import touch_buffer
+from handlers.jobs import jobs, JobRegistry
+from handlers.notifications import wake_outbox
+from handlers.telegram_cache import telegram_cache
+from handlers.tasks.reward_scheduler import reward_scheduler
+from loader import redis_client
+
+logger = logging.getLogger(__name__)
+
+STATS_ROLLUP_KEY = "stats:rollup"
+
+
+def _compute_stats(database: Database) -> dict[str, Any]:
+    today = datetime.now().date()
+    users, new_today, boosted, active_referrals = (
+        User.select(
+            fn.COUNT(User.user_id),
+            fn.COUNT(Case(None, [(User.date >= today, 1)])),
+            fn.COUNT(Case(None, [(User.boost == True, 1)])),
+            fn.COUNT(Case(None, [(User.is_active_referral == True, 1)])),
+        ).tuples().first(database)
+    )
+    pending_rewards = PendingReward.select().where(PendingReward.status == "pending").count(database)
+    outbox_pending, outbox_failed = (
+        OutboxMessage.select(
+            fn.COUNT(Case(None, [(OutboxMessage.status == "pending", 1)])),
+            fn.COUNT(Case(None, [(OutboxMessage.status == "failed", 1)])),
+        ).where(OutboxMessage.status != "sent").tuples().first(database)
+    )
+    return {
+        "users": users,
+        "new_today": new_today,
+        "boosted": boosted,
+        "active_referrals": active_referrals,
+        "pending_rewards": pending_rewards,
+        "outbox_pending": outbox_pending,
+        "outbox_failed": outbox_failed,
+        "computed_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+async def stats_rollup() -> None:
+    """Recompute the admin counters and publish them in Redis for every process."""
+    stats = await read_db(_compute_stats)
+    await redis_client.set(STATS_ROLLUP_KEY, json.dumps(stats), ex=STATS_ROLLUP_INTERVAL * 3)
+
+
+async def get_stats_rollup() -> Optional[dict[str, Any]]:
+    """Latest rollup, or None if it is missing or Redis is unavailable."""
+    try:
+        raw = await redis_client.get(STATS_ROLLUP_KEY)
+    except Exception as e:
+        logger.warning(f"Сводная статистика недоступна: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+async def cache_warmup() -> None:
+    """Resync Redis-side indexes with the DB."""
+    await reward_scheduler.rebuild()
+
+
+async def ledger_snapshots() -> None:
+    """Fold recent balance ledger rows into per-user snapshots."""
+    moved = await run_db(ledger.take_snapshots)
+    if moved:
+        logger.info(f"Снимки баланса обновлены: {moved}")
+
+
+async def archive_rewards() -> None:
+    """Move old settled rewards to the monthly archive and pre-create partitions."""
+    await run_db(archive.ensure_partitions, datetime.now().date())
+    older_than = datetime.now() - timedelta(days=REWARD_ARCHIVE_DAYS)
+    total = 0
+    while True:
+        # По пачке за вызов, чтобы не занимать поток БД надолго
+        moved = await run_db(archive.archive_batch, older_than, REWARD_ARCHIVE_BATCH)
+        total += moved
+        if moved < REWARD_ARCHIVE_BATCH:
+            break
+    if total:
+        logger.info(f"Награды перенесены в архив: {total}")
+
+
+async def reconcile_referrals() -> None:
+    """Repair drift in the denormalised referral counters."""
+    fixed = await run_db(referrals.reconcile_referral_counters)
+    if fixed:
+        logger.warning(f"Счётчики рефералов исправлены у пользователей: {fixed}")
+
+
+async def flush_touches() -> None:
+    """Write buffered last_active (and other touch columns) to the DB."""
+    updated = await touch_buffer.flush()
+    if updated:
+        logger.debug(f"Отметки активности записаны: {updated}")
+
+
+async def close_task_quotas() -> None:
+    """Deactivate filled local tasks and notify their owners."""
+    while True:
+        closed = await run_db(claims.close_filled_tasks)
+        if not closed:
+            break
+        logger.info(f"Задания с набранной квотой закрыты: {closed}")
+        wake_outbox()
+
+
+def _active_task_chat_ids() -> list[int]:
+    return [chat_id for (chat_id,) in Task.select(Task.chat_id).where(Task.is_active).distinct().tuples()]
+
+
+async def refresh_chat_metadata() -> None:
+    """Refresh cached titles of all active task channels."""
+    refreshed = await telegram_cache.refresh_chats(await run_db(_active_task_chat_ids))
+    if refreshed:
+        logger.info(f"Данные каналов обновлены: {refreshed}")
+
+
+async def fetch_missing_chats() -> None:
+    """Fetch chats that views asked for but the cache did not have."""
+    await telegram_cache.refresh_chats(())
+
+
+async def backup() -> None:
+    """pg_dump in a thread, so the event loop and DB workers stay free."""
+    from database.backup import backup_database
+    dump_file = await asyncio.to_thread(backup_database)
+    logger.info(f"Бэкап БД сохранён: {dump_file}")
+
+
+def register_jobs(registry: JobRegistry = jobs) -> None:
+    """All periodic jobs and their schedules."""
+    registry.add("stats_rollup", stats_rollup, "interval",
+                 seconds=STATS_ROLLUP_INTERVAL, run_at_start=True)
+    registry.add("cache_warmup", cache_warmup, "interval", seconds=CACHE_WARMUP_INTERVAL)
+    registry.add("touch_flush", flush_touches, "interval", seconds=TOUCH_FLUSH_INTERVAL)
+    registry.add("task_quotas", close_task_quotas, "interval",
+                 seconds=TASK_QUOTA_SWEEP_INTERVAL, run_at_start=True)
+    registry.add("chat_metadata", refresh_chat_metadata, "interval",
+                 seconds=CHAT_META_REFRESH_INTERVAL, run_at_start=True)
+    registry.add("chat_metadata_missing", fetch_missing_chats, "interval", seconds=60)
+    registry.add("ledger_snapshots", ledger_snapshots, "interval", seconds=LEDGER_SNAPSHOT_INTERVAL)
+    if REWARD_ARCHIVE_DAYS > 0:
+        registry.add("reward_archive", archive_rewards, "cron", hour=5, minute=30,
+                     misfire_grace_time=3600, run_at_start=True)
+    registry.add("referral_counters", reconcile_referrals, "cron", hour=5, minute=0, misfire_grace_time=3600)
+    if BACKUP_CRON_HOUR >= 0:
+        # Бэкап, пропущенный из-за перезапуска, догоняем в течение часа
+        registry.add("backup", backup, "cron", hour=BACKUP_CRON_HOUR, minute=0, misfire_grace_time=3600)
@@ -0,0 +1,97 @@
+"""Redis index of channel members, kept current by ``chat_member`` updates.
+
+The bot is an administrator of every local-task channel, so Telegram sends
+it a ``chat_member`` update whenever someone joins or leaves. The sorted set
+``members:<chat_id>`` maps user IDs known to be members to the time their
+membership was last confirmed, and ``is_member`` answers from it. It calls
+``get_chat_member`` for users the index has not seen (members from before
+the bot received these updates, or after Redis lost the set) and for entries
+older than ``MEMBER_CONFIRM_TTL``: a departure while the bot was not polling
+is never delivered, so a positive entry is trusted only for a bounded time.
+A positive answer is written back with the current time. Negative answers
+are not stored; a user who joins after a failed check is added by the
+update. Expired entries are pruned on write, so a set never needs a key TTL.
+
+``apply`` reports joins and departures to the caller, so anti-fraud rules
+can act on users who leave after claiming a reward.
+"""
+import logging
+import time
+from typing import Optional
+
+from aiogram.types import ChatMemberUpdated
+
+from loader import bot, redis_client
+
+logger = logging.getLogger(__name__)
+
+MEMBERS_KEY_PREFIX = "members:"
+MEMBER_CONFIRM_TTL = 24 * 3600  # секунды; старше — перепроверка через Bot API
+MEMBER_STATUSES = ("member", "administrator", "creator", "restricted")
+
+JOINED = "joined"
+LEFT = "left"
+
+
+class MembershipIndex:
+    """Per-channel Redis sorted sets of member user IDs with a Bot API fallback."""
+
+    def __init__(self, bot, redis, prefix: str = MEMBERS_KEY_PREFIX, ttl: int = MEMBER_CONFIRM_TTL):
+        self._bot = bot
+        self._redis = redis
+        self._prefix = prefix
+        self._ttl = ttl
+
+    def _key(self, chat_id: int) -> str:
+        return f"{self._prefix}{chat_id}"
+
+    async def _add(self, chat_id: int, user_id: int) -> None:
+        key = self._key(chat_id)
+        now = time.time()
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.zadd(key, {str(user_id): now})
+                pipe.zremrangebyscore(key, "-inf", now - self._ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Не удалось записать участника {user_id} канала {chat_id}: {e}")
+
+    async def _remove(self, chat_id: int, user_id: int) -> None:
+        try:
+            await self._redis.zrem(self._key(chat_id), str(user_id))
+        except Exception as e:
+            logger.warning(f"Не удалось удалить участника {user_id} канала {chat_id}: {e}")
+
+    async def is_member(self, chat_id: int, user_id: int) -> bool:
+        """Whether the user is a member of the chat; the Bot API is asked on a missing or expired entry."""
+        try:
+            confirmed_at = await self._redis.zscore(self._key(chat_id), str(user_id))
+            if confirmed_at is not None and time.time() - confirmed_at < self._ttl:
+                return True
+        except Exception as e:
+            logger.warning(f"Индекс участников недоступен: {e}")
+
+        try:
+            member = await self._bot.get_chat_member(chat_id, user_id)
+        except Exception as e:
+            logger.debug(f"Failed to check subscription for {user_id} in {chat_id}: {e}")
+            return False
+        if member.status not in MEMBER_STATUSES:
+            return False
+        await self._add(chat_id, user_id)
+        return True
+
+    async def apply(self, update: ChatMemberUpdated) -> Optional[str]:
+        """Record a ``chat_member`` update; returns JOINED, LEFT or None if membership did not change."""
+        chat_id = update.chat.id
+        user_id = update.new_chat_member.user.id
+        was_member = update.old_chat_member.status in MEMBER_STATUSES
+        is_member = update.new_chat_member.status in MEMBER_STATUSES
+        if is_member:
+            await self._add(chat_id, user_id)
+            return None if was_member else JOINED
+        await self._remove(chat_id, user_id)
+        return LEFT if was_member else None
+
+
+membership_index = MembershipIndex(bot, redis_client)
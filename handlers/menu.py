@@ -5,11 +5,12 @@ from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from config import MINI_APP_URL
-from database.models import User, Gift
-from keyboards.keyboard import toggle_ref_reward_keyboard, minigame_keyboard, dynamic_gifts_keyboard
+from database.gift_catalog import gift_catalog
+from database.repository import get_snapshot, get_balance
+from keyboards.keyboard import toggle_ref_reward_keyboard, minigame_keyboard
 from handlers.tasks.tasks_view import show_tasks_from_message
 from handlers.tasks.add_task import add_task_start
-from handlers.profile import build_profile_text_simple
+from handlers.profile import build_profile_text_simple, load_profile
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -28,37 +29,29 @@ async def tasks_button(message: Message, state: FSMContext) -> None:
 @router.message(F.text == "🍄 Профиль")
 async def profile_button(message: Message) -> None:
     """Show detailed user profile with stats."""
-    try:
-        user = User.get(User.user_id == message.from_user.id)
-
-        active_refs = User.select().where(
-            (User.referral == user.user_id) &
-            (User.is_active_referral == True)
-        ).count()
-        inactive_refs = User.select().where(
-            (User.referral == user.user_id) &
-            (User.is_active_referral == False)
-        ).count()
-
-        # Экранируем full_name, чтобы не сломать HTML
-        safe_full_name = escape(message.from_user.full_name)
-
-        profile_text = build_profile_text_simple(
-            user.user_id,
-            safe_full_name,
-            user,
-            active_refs,
-            inactive_refs
-        )
-        profile_text += "\n\n⬇️ Награда от рефералов ⬇️"
-
-        await message.answer(
-            profile_text,
-            parse_mode="HTML",
-            reply_markup=toggle_ref_reward_keyboard(is_showing=False)
-        )
-    except User.DoesNotExist:
+    user, referrer, active_refs, inactive_refs = await load_profile(message.from_user.id)
+    if not user:
         await message.answer("Сначала начните работу с ботом через /start")
+        return
+
+    # Экранируем full_name, чтобы не сломать HTML
+    safe_full_name = escape(message.from_user.full_name)
+
+    profile_text = build_profile_text_simple(
+        user.user_id,
+        safe_full_name,
+        user,
+        active_refs,
+        inactive_refs,
+        referrer
+    )
+    profile_text += "\n\n⬇️ Награда от рефералов ⬇️"
+
+    await message.answer(
+        profile_text,
+        parse_mode="HTML",
+        reply_markup=toggle_ref_reward_keyboard(is_showing=False)
+    )
 
 
 @router.message(F.text == "📝 Добавить задание")
@@ -71,8 +64,7 @@ async def add_task_button(message: Message, state: FSMContext) -> None:
 @router.message(F.text == "🎰 Мини-игры")
 async def minigame_button(message: Message) -> None:
     """Show minigames menu."""
-    user = User.get_or_none(User.user_id == message.from_user.id)
-    balance = f"{int(user.balance)}" if user else "0"
+    balance = await get_balance(message.from_user.id)
     await message.answer(
         "🎮 <b>Мини-игры</b>\n\n"
         f"💰 Баланс: {balance} 💎\n"
@@ -92,13 +84,13 @@ async def minigame_button(message: Message) -> None:
 @router.message(F.text == "🎁 Обменять алмазики")
 async def exchange_button(message: Message) -> None:
     """Show exchange options."""
-    user = User.get_or_none(User.user_id == message.from_user.id)
+    user = await get_snapshot(message.from_user.id)
     if not user:
         await message.answer("Сначала начните работу с ботом через /start")
         return
 
     balance = int(user.balance)
-    gifts = list(Gift.select().where(Gift.is_active == True))
+    _, gifts_kb = await gift_catalog.get()
     text = (
         f"💎 <b>Обмен алмазов</b>\n\n"
         f"✨ <b>Ваш баланс:</b> {balance} 💎\n\n"
@@ -111,7 +103,7 @@ async def exchange_button(message: Message) -> None:
     await message.answer(
         text,
         parse_mode="HTML",
-        reply_markup=dynamic_gifts_keyboard(gifts)
+        reply_markup=gifts_kb
     )
 
 
@@ -7,7 +7,8 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.enums.dice_emoji import DiceEmoji
 from aiogram.exceptions import TelegramAPIError
 
-from database.models import User
+from database import ledger
+from database.repository import get_snapshot, charge_balance, add_balance
 from loader import bot
 from config import chat_game
 from keyboards.keyboard import minigame_keyboard, back_button_keyboard
@@ -34,7 +35,7 @@ GAME_CONFIG = {
 @router.callback_query(F.data == "minigame")
 async def minigame_menu(call: CallbackQuery):
     """Меню выбора мини-игр"""
-    user = User.get_or_none(User.user_id == call.from_user.id)
+    user = await get_snapshot(call.from_user.id)
     if not user:
         await call.answer("❌ Сначала начните диалог с ботом.", show_alert=True)
         return
@@ -75,9 +76,7 @@ async def launch_minigame(message: Message, tg_user: TgUser, state: FSMContext,
     emoji, win_condition, payout, game_name = GAME_CONFIG[game_key]
 
     # Списание ставки (атомарная операция)
-    if not User.update(balance=User.balance - 5).where(
-        (User.user_id == tg_user.id) & (User.balance >= 5)
-    ).execute():
+    if await charge_balance(tg_user.id, 5, ledger.MINIGAME_BET, game_key) is None:
         await message.answer("❌ Недостаточно 💎 для ставки!")
         return
 
@@ -91,7 +90,7 @@ async def launch_minigame(message: Message, tg_user: TgUser, state: FSMContext,
         # Обработка результата
         if not dice_msg.dice:
             # Возврат ставки при ошибке
-            User.update(balance=User.balance + 5).where(User.user_id == tg_user.id).execute()
+            await add_balance(tg_user.id, 5, ledger.MINIGAME_REFUND, game_key)
             await message.answer("⚠️ Ошибка игры. Ставка возвращена.")
             return
 
@@ -100,7 +99,7 @@ async def launch_minigame(message: Message, tg_user: TgUser, state: FSMContext,
 
         # Начисление выигрыша
         if reward:
-            User.update(balance=User.balance + reward).where(User.user_id == tg_user.id).execute()
+            await add_balance(tg_user.id, reward, ledger.MINIGAME_WIN, game_key)
 
         # Результат игры
         result = f"✅ <b>ПОБЕДА!</b>\n+{reward} 💎" if reward else "❌ <b>Проигрыш.</b>"
@@ -0,0 +1,157 @@
+"""Outbox sender: delivers notifications queued by business code.
+
+Rows are written with ``database.outbox.enqueue_message`` in the same
+transaction as the change they report. This worker claims due rows with
+FOR UPDATE SKIP LOCKED (so it can run in every process), sends them at a
+global rate limit and retries failures with exponential backoff. Delivery
+is at-least-once: a row claimed by a crashed process is retried after
+``CLAIM_LEASE`` seconds.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+from config import OUTBOX_RATE_LIMIT, OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS
+from database.executor import run_db
+from database.models import db, OutboxMessage
+from database.outbox import enqueue_message
+from loader import bot
+
+logger = logging.getLogger(__name__)
+
+CLAIM_LEASE = 60  # секунды, на которые строка «забирается» отправителем
+IDLE_POLL = 30  # опрос очереди без пробуждений (сообщения других процессов)
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 600
+SENT_RETENTION = timedelta(days=7)
+PURGE_INTERVAL = 3600
+
+_wakeup = asyncio.Event()
+
+
+def wake_outbox() -> None:
+    """Nudge the sender after a transaction with outbox rows has committed."""
+    _wakeup.set()
+
+
+async def notify(chat_id: int, text: str, parse_mode: Optional[str] = None, reply_markup=None) -> None:
+    """Queue a standalone notification (no accompanying DB change)."""
+    await run_db(enqueue_message, chat_id, text, parse_mode, reply_markup)
+    wake_outbox()
+
+
+def _claim_batch(limit: int) -> list[OutboxMessage]:
+    now = datetime.now()
+    with db.atomic():
+        due = (OutboxMessage
+               .select(OutboxMessage.id)
+               .where(
+                   (OutboxMessage.status == "pending") &
+                   (OutboxMessage.next_attempt_at <= now)
+               )
+               .order_by(OutboxMessage.id)
+               .limit(limit)
+               .for_update("FOR UPDATE SKIP LOCKED"))
+        rows = list(
+            OutboxMessage.update(
+                attempts=OutboxMessage.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=CLAIM_LEASE),
+            )
+            .where(OutboxMessage.id.in_(due))
+            .returning(OutboxMessage)
+            .execute()
+        )
+    return sorted(rows, key=lambda m: m.id)
+
+
+def _mark_sent(ids: list[int]) -> None:
+    if ids:
+        OutboxMessage.update(status="sent", sent_at=datetime.now(), last_error=None) \
+            .where(OutboxMessage.id.in_(ids)).execute()
+
+
+def _reschedule(message_id: int, delay: float, error: str) -> None:
+    OutboxMessage.update(
+        next_attempt_at=datetime.now() + timedelta(seconds=delay),
+        last_error=error[:1000],
+    ).where(OutboxMessage.id == message_id).execute()
+
+
+def _mark_failed(message_id: int, error: str) -> None:
+    OutboxMessage.update(status="failed", last_error=error[:1000]) \
+        .where(OutboxMessage.id == message_id).execute()
+
+
+def _purge_sent() -> int:
+    return OutboxMessage.delete().where(
+        (OutboxMessage.status == "sent") &
+        (OutboxMessage.sent_at < datetime.now() - SENT_RETENTION)
+    ).execute()
+
+
+async def _deliver(message: OutboxMessage) -> bool:
+    """Send one row. Returns True if it was delivered."""
+    kwargs = {}
+    if message.parse_mode:
+        kwargs["parse_mode"] = message.parse_mode
+    if message.reply_markup:
+        kwargs["reply_markup"] = InlineKeyboardMarkup.model_validate_json(message.reply_markup)
+
+    try:
+        await bot.send_message(message.chat_id, message.text, **kwargs)
+        return True
+    except TelegramRetryAfter as e:
+        # Флуд-лимит Telegram: ждём столько, сколько он попросил
+        await run_db(_reschedule, message.id, e.retry_after, str(e))
+    except (TelegramForbiddenError, TelegramBadRequest) as e:
+        # Бот заблокирован, чат не найден, битая разметка — повтор не поможет
+        logger.warning(f"Outbox {message.id} → {message.chat_id} не доставлено: {e}")
+        await run_db(_mark_failed, message.id, str(e))
+    except Exception as e:
+        if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+            logger.error(f"Outbox {message.id} → {message.chat_id}: попытки исчерпаны: {e}")
+            await run_db(_mark_failed, message.id, str(e))
+        else:
+            delay = min(RETRY_BASE_DELAY * 2 ** (message.attempts - 1), RETRY_MAX_DELAY)
+            await run_db(_reschedule, message.id, delay, str(e))
+    return False
+
+
+async def process_outbox(rate_limit: float = OUTBOX_RATE_LIMIT, batch_size: int = OUTBOX_BATCH_SIZE):
+    """Drain the outbox forever, at most ``rate_limit`` messages per second."""
+    interval = 1 / rate_limit if rate_limit > 0 else 0
+    last_purge = 0.0
+    loop = asyncio.get_running_loop()
+
+    while True:
+        _wakeup.clear()
+        batch: list[OutboxMessage] = []
+        try:
+            batch = await run_db(_claim_batch, batch_size)
+            sent = []
+            for message in batch:
+                started = loop.time()
+                if await _deliver(message):
+                    sent.append(message.id)
+                await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+            await run_db(_mark_sent, sent)
+
+            if loop.time() - last_purge > PURGE_INTERVAL:
+                last_purge = loop.time()
+                purged = await run_db(_purge_sent)
+                if purged:
+                    logger.info(f"Outbox: удалено отправленных сообщений: {purged}")
+        except Exception as e:
+            logger.exception(f"Ошибка отправителя outbox: {e}")
+            await asyncio.sleep(RETRY_BASE_DELAY)
+            continue
+
+        if len(batch) < batch_size:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=IDLE_POLL)
+            except asyncio.TimeoutError:
+                pass
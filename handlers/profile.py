@@ -1,7 +1,9 @@
 from aiogram import F, Router
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
+from database.replica import read_db, fetch_all
 from database.models import User
+from database.repository import get_snapshot, count_referrals
 from keyboards.keyboard import toggle_ref_reward_keyboard
 from aiogram.exceptions import TelegramBadRequest
 
@@ -9,20 +11,20 @@ router = Router()
 
 
 async def get_referral_rewards_info(user_id: int) -> str:
-    active_refs = (User
-                   .select()
-                   .where(
-                       (User.referral == user_id) &
-                       (User.is_active_referral == True)
-                   )
-                   .order_by(User.task_count_diamonds.desc())
-                   .limit(10))
-    
-    total_active = User.select().where(
-        (User.referral == user_id) &
-        (User.is_active_referral == True)
-    ).count()
-    
+    active_refs = await read_db(
+        fetch_all,
+        User
+        .select()
+        .where(
+            (User.referral == user_id) &
+            (User.is_active_referral == True)
+        )
+        .order_by(User.task_count_diamonds.desc())
+        .limit(10)
+    )
+
+    total_active, _ = await count_referrals(user_id)
+
     total_reward = 0
     rewards_info = []
     
@@ -49,11 +51,26 @@ async def get_referral_rewards_info(user_id: int) -> str:
     )
 
 
-def build_profile_text_simple(user_id: int, full_name: str, user, active_refs: int, inactive_refs: int) -> str:
+async def load_profile(user_id: int) -> tuple:
+    """Load (user, referrer, active_refs, inactive_refs) for the profile screen."""
+    user = await get_snapshot(user_id)
+    if not user:
+        return None, None, 0, 0
+    referrer = await get_snapshot(user.referral) if user.referral else None
+    return user, referrer, user.active_referrals, user.pending_referrals
+
+
+def build_profile_text_simple(
+    user_id: int,
+    full_name: str,
+    user,
+    active_refs: int,
+    inactive_refs: int,
+    referrer=None,
+) -> str:
     referrer_info = "Первобытный"
     if user.referral:
         ref_id = user.referral  # Already an integer
-        referrer = User.get_or_none(User.user_id == ref_id)
         if referrer:
             referrer_info = f"@{referrer.username} (ID: {ref_id})" if referrer.username else f"ID: {ref_id}"
         else:
@@ -84,31 +101,24 @@ def build_profile_text_simple(user_id: int, full_name: str, user, active_refs: i
     )
 
 
-def build_profile_text(call: CallbackQuery, user, active_refs: int, inactive_refs: int) -> str:
-    return build_profile_text_simple(call.from_user.id, call.from_user.full_name, user, active_refs, inactive_refs)
+def build_profile_text(call: CallbackQuery, user, active_refs: int, inactive_refs: int, referrer=None) -> str:
+    return build_profile_text_simple(
+        call.from_user.id, call.from_user.full_name, user, active_refs, inactive_refs, referrer
+    )
 
 
 @router.callback_query(F.data == 'profile')
 async def profile_handler(call: CallbackQuery, state: FSMContext):
     user_id = call.from_user.id
-    user = User.get_or_none(User.user_id == user_id)
+    user, referrer, active_refs, inactive_refs = await load_profile(user_id)
 
     if not user:
         await call.answer("❌ Профиль не найден. Напишите /start", show_alert=True)
         return
 
     await state.update_data(show_ref_rewards=False)
-    
-    active_refs = User.select().where(
-        (User.referral == user_id) &
-        (User.is_active_referral == True)
-    ).count()
-    inactive_refs = User.select().where(
-        (User.referral == user_id) &
-        (User.is_active_referral == False)
-    ).count()
-
-    profile_text = build_profile_text(call, user, active_refs, inactive_refs)
+
+    profile_text = build_profile_text(call, user, active_refs, inactive_refs, referrer)
     profile_text += "\n\n⬇️ Награда от рефералов ⬇️"
     
     # Безопасная отправка: удаляем старое и отправляем новое
@@ -132,21 +142,12 @@ async def toggle_ref_rewards_handler(call: CallbackQuery, state: FSMContext):
     show_ref_rewards = not data.get('show_ref_rewards', False)
     await state.update_data(show_ref_rewards=show_ref_rewards)
     
-    user = User.get_or_none(User.user_id == user_id)
+    user, referrer, active_refs, inactive_refs = await load_profile(user_id)
     if not user:
         await call.answer("❌ Профиль не найден. Напишите /start", show_alert=True)
         return
 
-    active_refs = User.select().where(
-        (User.referral == user_id) &
-        (User.is_active_referral == True)
-    ).count()
-    inactive_refs = User.select().where(
-        (User.referral == user_id) &
-        (User.is_active_referral == False)
-    ).count()
-
-    profile_text = build_profile_text(call, user, active_refs, inactive_refs)
+    profile_text = build_profile_text(call, user, active_refs, inactive_refs, referrer)
     
     if show_ref_rewards:
         ref_rewards_info = await get_referral_rewards_info(user_id)
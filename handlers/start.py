@@ -1,12 +1,14 @@
 """Bot start handler."""
 import logging
-from datetime import datetime
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import CommandStart
 from config import MINI_APP_URL
-from database.models import User
+from database.executor import run_db
+from database.repository import attach_referral, get_user, user_exists
+from database.user_cache import user_cache
 from keyboards.keyboard import start_keyboard
+from handlers.activity import touch_buffer
 from handlers.utils import create_user, is_admin
 
 logger = logging.getLogger(__name__)
@@ -27,26 +29,26 @@ async def start_handler(message: Message) -> None:
         if candidate.isdigit() and int(candidate) != user_id:
             candidate_id = int(candidate)
             # Critical: Only accept existing users as referrers
-            if User.select().where(User.user_id == candidate_id).exists():
+            if await user_exists(candidate_id):
                 referrer_id = candidate_id
                 logger.debug(f"Valid referral: {user_id} ← {referrer_id}")
             else:
                 logger.debug(f"Invalid referrer ID {candidate_id} for user {user_id}")
 
     # Create or update user
-    existing_user = User.get_or_none(User.user_id == user_id)
+    existing_user = await get_user(user_id)
     if not existing_user:
-        create_user(user_id, referrer_id, user)
+        await run_db(create_user, user_id, referrer_id, user)
+        if referrer_id:
+            await user_cache.invalidate(referrer_id)
         welcome_type = "new"
     else:
         # Prevent referral hijacking on subsequent starts
         if referrer_id and not existing_user.referral:
-            existing_user.referral = referrer_id
-            existing_user.save()
-            logger.info(f"Late referral attached for user {user_id}: {referrer_id}")
-        
-        existing_user.last_active = datetime.now()
-        existing_user.save()
+            if await attach_referral(user_id, referrer_id):
+                logger.info(f"Late referral attached for user {user_id}: {referrer_id}")
+
+        await touch_buffer.touch(user_id)
         welcome_type = "returning"
 
     # Personalized welcome message
@@ -71,17 +73,18 @@ async def start_handler(message: Message) -> None:
             "чтобы копить алмазы для обмена на подарки!"
         )
 
+    admin = is_admin(user_id)
     try:
         await message.answer(
             text,
-            reply_markup=start_keyboard(is_admin(user_id), MINI_APP_URL),
+            reply_markup=start_keyboard(admin, MINI_APP_URL),
             parse_mode="HTML"
         )
     except Exception as e:
         logger.exception(f"Failed to send welcome message to {user_id}: {e}")
         # Fallback without parse_mode
         clean_text = text.replace("<b>", "").replace("</b>", "")
-        await message.answer(clean_text, reply_markup=start_keyboard(is_admin(user_id), MINI_APP_URL))
+        await message.answer(clean_text, reply_markup=start_keyboard(admin, MINI_APP_URL))
 
 
 @router.callback_query(F.data == "hide_referral")
@@ -5,10 +5,13 @@ from aiogram import Router, F
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, ReplyKeyboardRemove
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
-from peewee import fn
 
 from config import TASK_LOG_CHAT_ID
-from database.models import User, Task, db
+from database.outbox import Notice
+from database.repository import get_user, get_active_task_for_chat, create_paid_task
+from handlers.notifications import wake_outbox
+from handlers.telegram_cache import telegram_cache
+from handlers.utils import is_admin
 from loader import bot
 from handlers.tasks.states import AddTask
 
@@ -38,10 +41,8 @@ async def cancel_add_task(callback: CallbackQuery, state: FSMContext) -> None:
     try:
         # Return to main menu
         from keyboards.keyboard import start_keyboard
-        from database.models import Root
         
         user_id = callback.from_user.id
-        is_admin = Root.get_or_none(Root.root_id == user_id) is not None
         
         await callback.message.edit_text(
             "❌ Создание задания отменено. Возврат в главное меню...",
@@ -49,20 +50,18 @@ async def cancel_add_task(callback: CallbackQuery, state: FSMContext) -> None:
         )
         await callback.message.answer(
             "👋 Выберите действие:",
-            reply_markup=start_keyboard(is_admin=is_admin)
+            reply_markup=start_keyboard(is_admin=is_admin(user_id))
         )
     except (TelegramBadRequest, TelegramForbiddenError):
         try:
             from keyboards.keyboard import start_keyboard
-            from database.models import Root
             
             user_id = callback.from_user.id
-            is_admin = Root.get_or_none(Root.root_id == user_id) is not None
             
             await callback.message.delete()
             await callback.message.answer(
                 "👋 Выберите действие:",
-                reply_markup=start_keyboard(is_admin=is_admin)
+                reply_markup=start_keyboard(is_admin=is_admin(user_id))
             )
         except Exception:
             pass
@@ -111,10 +110,7 @@ def _extract_channel_id(text: str) -> str | None:
 async def _check_bot_admin_rights(chat_id: int) -> tuple[bool, str]:
     """Verify bot has admin rights in chat. Returns (is_valid, error_message)."""
     try:
-        me = await bot.get_me()
-        member = await bot.get_chat_member(chat_id, me.id)
-        
-        if member.status in ("administrator", "creator"):
+        if await telegram_cache.bot_is_admin(chat_id):
             return True, ""
         return False, "🔒 Бот не является администратором канала. Добавьте бота в админы."
     
@@ -134,13 +130,11 @@ async def process_channel_link(message: Message, state: FSMContext) -> None:
     # Check if user wants to cancel
     if message.text and "отмена" in message.text.lower():
         from keyboards.keyboard import start_keyboard
-        from database.models import Root
         
         await state.clear()
-        is_admin = Root.get_or_none(Root.root_id == message.from_user.id) is not None
         await message.answer(
             "❌ Создание задания отменено.",
-            reply_markup=start_keyboard(is_admin=is_admin)
+            reply_markup=start_keyboard(is_admin=is_admin(message.from_user.id))
         )
         return
     
@@ -171,6 +165,7 @@ async def process_channel_link(message: Message, state: FSMContext) -> None:
     chat_ref = f"@{ident}"
     try:
         chat = await bot.get_chat(chat_ref)
+        await telegram_cache.store_chat(chat)
         
         # Additional validation for channels
         if chat.type not in ("channel", "supergroup"):
@@ -206,10 +201,7 @@ async def process_channel_link(message: Message, state: FSMContext) -> None:
         return
 
     # Check for existing active task
-    existing_task = Task.get_or_none(
-        (Task.chat_id == chat.id) & 
-        (Task.is_active == True)
-    )
+    existing_task = await get_active_task_for_chat(chat.id)
     if existing_task:
         owner = existing_task.owner_id
         await message.answer(
@@ -238,13 +230,11 @@ async def process_sub_count(message: Message, state: FSMContext) -> None:
     # Check if user wants to cancel
     if message.text and "отмена" in message.text.lower():
         from keyboards.keyboard import start_keyboard
-        from database.models import Root
         
         await state.clear()
-        is_admin = Root.get_or_none(Root.root_id == message.from_user.id) is not None
         await message.answer(
             "❌ Создание задания отменено.",
-            reply_markup=start_keyboard(is_admin=is_admin)
+            reply_markup=start_keyboard(is_admin=is_admin(message.from_user.id))
         )
         return
     
@@ -261,10 +251,8 @@ async def process_sub_count(message: Message, state: FSMContext) -> None:
     except Exception:
         pass
 
-    # Get user with atomic lock to prevent race conditions
-    try:
-        user = User.select().where(User.user_id == message.from_user.id).for_update().get()
-    except User.DoesNotExist:
+    user = await get_user(message.from_user.id)
+    if not user:
         await message.answer(
             "❌ Профиль не найден. Напишите /start",
             reply_markup=back_inline_keyboard()
@@ -320,56 +308,53 @@ async def process_sub_count(message: Message, state: FSMContext) -> None:
         await state.clear()
         return
 
-    # Create task with atomic transaction
+    # Charge the owner and create the task in one transaction
     try:
-        # Use database transaction for atomic operations
-        with db.atomic():  # Assuming `db` is your Peewee database instance
-            # Deduct balance
-            user.balance -= cost
-            user.save()
-            
-            # Create task
-            task = Task.create(
-                invite_link=invite_link,
-                chat_id=chat_id,
-                reward=LOCAL_TASK_REWARD,
-                is_active=True,
-                owner_id=message.from_user.id,
-                target_subscribers=target,
-                current_subscribers=0
+        owner_id = message.from_user.id
+
+        def task_log(task) -> Notice:
+            return Notice(
+                TASK_LOG_CHAT_ID,
+                f"💎 Новое задание #{task.id}\n"
+                f"Владелец: {owner_id}\n"
+                f"Канал: {invite_link}\n"
+                f"Цель: {target} участников\n"
+                f"Стоимость: {cost} 💎"
+            )
+
+        created = await create_paid_task(
+            owner_id=owner_id,
+            invite_link=invite_link,
+            chat_id=chat_id,
+            reward=LOCAL_TASK_REWARD,
+            target_subscribers=target,
+            cost=cost,
+            notice=task_log if TASK_LOG_CHAT_ID else None,
+        )
+        if created is None:
+            await message.answer(
+                f"❌ Недостаточно алмазов!\n"
+                f"Требуется: {cost} 💎",
+                reply_markup=back_inline_keyboard()
             )
+            return
+        task, new_balance = created
 
-        # Log to admin chat if configured
+        # Log entry was queued in the outbox with the task
         if TASK_LOG_CHAT_ID:
-            try:
-                await bot.send_message(
-                    TASK_LOG_CHAT_ID,
-                    f"💎 Новое задание #{task.id}\n"
-                    f"Владелец: {message.from_user.id}\n"
-                    f"Канал: {invite_link}\n"
-                    f"Цель: {target} участников\n"
-                    f"Стоимость: {cost} 💎"
-                )
-            except Exception as e:
-                logger.error(f"Failed to log task creation: {e}")
+            wake_outbox()
 
         await message.answer(
             f"✅ Задание успешно создано!\n"
             f"🎯 Цель: {target} участников\n"
             f"💎 Списано: {cost} алмазов\n"
-            f"💰 Текущий баланс: {user.balance} 💎\n\n"
+            f"💰 Текущий баланс: {new_balance} 💎\n\n"
             f"Бот начнёт привлекать участников в течение 15 минут.",
             reply_markup=None  # Clean interface after completion
         )
-        
+
     except Exception as e:
-        # Refund on failure
-        try:
-            user.balance += cost
-            user.save()
-        except Exception as refund_error:
-            logger.critical(f"Refund failed after task creation error: {refund_error}")
-        
+        # Транзакция откатилась — баланс не списан
         await message.answer(
             "⚠️ Ошибка при создании задания. Средства возвращены на баланс.\n"
             "Попробуйте позже или обратитесь в поддержку.",
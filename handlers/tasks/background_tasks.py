@@ -2,24 +2,40 @@
 import logging
 import asyncio
 from datetime import datetime
+from html import escape
 
-from database.models import PendingReward, User
+from peewee import Value, fn
+
+from config import REWARD_SETTLEMENT_MODE, REWARD_BATCH_SIZE, REWARD_WORKERS, REWARD_NOTIFY_DIGEST
+from database import ledger
+from database.executor import run_db
+from database.models import db, PendingReward, User, BalanceLedger
+from database.outbox import enqueue_message, enqueue_messages
+from database.user_cache import user_cache
+from handlers.jobs import jobs
+from handlers.notifications import wake_outbox
 from handlers.tasks.referral_service import process_referral_reward
-from loader import bot
+from handlers.tasks.reward_scheduler import reward_scheduler
 
 logger = logging.getLogger(__name__)
 
+REWARD_RETRY_DELAY = 30  # секунды до повтора после ошибки начисления
+DIGEST_MAX_ITEMS = 15  # строк в сводке, остальное — «и ещё N»
+
 
 async def award_user(user: "User", reward: int) -> bool:
     """Начислить награду пользователю и обработать реферальную систему."""
     try:
         # Атомарное обновление БД
-        User.update({
-            User.balance: User.balance + int(reward),
-            User.task_count: User.task_count + 1,
-            User.task_count_diamonds: User.task_count_diamonds + int(reward)
-        }).where(User.user_id == user.user_id).execute()
-        
+        with db.atomic():
+            User.update({
+                User.balance: User.balance + int(reward),
+                User.task_count: User.task_count + 1,
+                User.task_count_diamonds: User.task_count_diamonds + int(reward)
+            }).where(User.user_id == user.user_id).execute()
+            ledger.record(user.user_id, int(reward), ledger.TASK_REWARD)
+        await user_cache.invalidate(user.user_id)
+
         user = User.get_by_id(user.user_id)
         await process_referral_reward(user, int(reward))
         return True
@@ -28,42 +44,215 @@ async def award_user(user: "User", reward: int) -> bool:
         return False
 
 
-async def process_pending_rewards():
-    """Unified pending rewards processor (runs every 5 minutes)."""
+def build_reward_digest(items: list[tuple[int, str]]) -> str:
+    """One message for all rewards a user received in a settlement batch."""
+    if len(items) == 1:
+        diamonds, title = items[0]
+        return f"💎 +{diamonds} алмазов за {escape(title or 'задание')}"
+
+    total = sum(diamonds for diamonds, _ in items)
+    lines = [
+        f"• +{diamonds} 💎 — {escape(title or 'задание')}"
+        for diamonds, title in items[:DIGEST_MAX_ITEMS]
+    ]
+    if len(items) > DIGEST_MAX_ITEMS:
+        lines.append(f"<i>…и ещё {len(items) - DIGEST_MAX_ITEMS}</i>")
+    return (
+        f"💎 <b>+{total} алмазов</b> за выполненные задания ({len(items)}):\n\n"
+        + "\n".join(lines)
+    )
+
+
+def _reward_messages(settled: list[tuple[int, int, str]]) -> list[tuple[int, str]]:
+    """Digest per user, or one message per reward when digests are off."""
+    if not REWARD_NOTIFY_DIGEST:
+        return [
+            (user_id, build_reward_digest([(diamonds, title)]))
+            for user_id, diamonds, title in settled
+        ]
+    per_user: dict[int, list[tuple[int, str]]] = {}
+    for user_id, diamonds, title in settled:
+        per_user.setdefault(user_id, []).append((diamonds, title))
+    return [(user_id, build_reward_digest(items)) for user_id, items in per_user.items()]
+
+
+def _settle_batch(now: datetime, limit: int) -> list[tuple[int, int, str]]:
+    """Credit up to ``limit`` due rewards with a fixed number of statements.
+
+    Marks the rows completed, adds per-user totals to balances and task
+    counters in one UPDATE ... FROM, journals every reward with one
+    INSERT ... SELECT, queues the reward notifications in the outbox, and
+    returns (user_id, diamonds, title) for every reward whose user still
+    exists.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED, so concurrent workers (in
+    this or other processes) take disjoint batches and never pay twice.
+    """
+    with db.atomic():
+        due = (PendingReward
+               .select(PendingReward.id)
+               .where(
+                   (PendingReward.status == "pending") &
+                   (PendingReward.scheduled_at <= now)
+               )
+               .order_by(PendingReward.scheduled_at)
+               .limit(limit)
+               .for_update("FOR UPDATE SKIP LOCKED"))
+        settled = list(
+            PendingReward.update(status="completed")
+            .where(PendingReward.id.in_(due))
+            .returning(PendingReward.id, PendingReward.user_id,
+                       PendingReward.diamonds, PendingReward.task_title)
+            .tuples()
+            .execute()
+        )
+        if not settled:
+            return []
+
+        totals = (PendingReward
+                  .select(
+                      PendingReward.user_id,
+                      fn.SUM(PendingReward.diamonds).alias("diamonds"),
+                      fn.COUNT(PendingReward.id).alias("rewards"),
+                  )
+                  .where(PendingReward.id.in_([row[0] for row in settled]))
+                  .group_by(PendingReward.user_id)
+                  .alias("totals"))
+        credited = set(
+            user_id for (user_id,) in
+            User.update({
+                User.balance: User.balance + totals.c.diamonds,
+                User.task_count: User.task_count + totals.c.rewards,
+                User.task_count_diamonds: User.task_count_diamonds + totals.c.diamonds,
+            })
+            .from_(totals)
+            .where(User.user_id == totals.c.user_id)
+            .returning(User.user_id)
+            .tuples()
+            .execute()
+        )
+
+        if credited:
+            BalanceLedger.insert_from(
+                PendingReward
+                .select(PendingReward.user_id, PendingReward.diamonds,
+                        Value(ledger.TASK_REWARD), PendingReward.task_key, Value(datetime.now()))
+                .where(
+                    PendingReward.id.in_([row[0] for row in settled]) &
+                    PendingReward.user_id.in_(list(credited))
+                ),
+                fields=[BalanceLedger.user_id, BalanceLedger.delta, BalanceLedger.reason,
+                        BalanceLedger.ref, BalanceLedger.created_at],
+            ).as_rowcount().execute()
+
+        credited_rewards = [
+            (user_id, int(diamonds), title)
+            for _, user_id, diamonds, title in settled
+            if user_id in credited
+        ]
+        enqueue_messages(_reward_messages(credited_rewards))
+
+    return credited_rewards
+
+
+def _referral_candidates(user_ids: list[int]) -> list[User]:
+    """Users from a settled batch who may have just become active referrals."""
+    return list(User.select().where(
+        User.user_id.in_(user_ids) &
+        (User.is_active_referral == False) &
+        (User.task_count >= 3) &
+        User.referral.is_null(False)
+    ))
+
+
+async def _after_settlement(settled: list[tuple[int, int, str]]) -> None:
+    """Referral activation for a committed batch."""
+    totals: dict[int, int] = {}
+    for user_id, diamonds, _ in settled:
+        totals[user_id] = totals.get(user_id, 0) + diamonds
+
+    for user in await run_db(_referral_candidates, list(totals)):
+        try:
+            await process_referral_reward(user, totals[user.user_id])
+        except Exception as e:
+            logger.exception(f"Ошибка реферальной награды {user.user_id}: {e}")
+
+
+async def settle_due_rewards(now: datetime, batch_size: int = REWARD_BATCH_SIZE) -> list[tuple[int, int, str]]:
+    """Settle every reward due by ``now`` in chunks of ``batch_size``.
+
+    Returns (user_id, diamonds, title) for every credited reward.
+    """
+    settled_all: list[tuple[int, int, str]] = []
     while True:
+        settled = await run_db(_settle_batch, now, batch_size)
+        if not settled:
+            break
+        settled_all.extend(settled)
+        await user_cache.invalidate(*{user_id for user_id, _, _ in settled})
+        wake_outbox()
+        await _after_settlement(settled)
+    if settled_all:
+        logger.info(f"Начислено отложенных наград: {len(settled_all)}")
+    return settled_all
+
+
+async def _settle_row_by_row(now: datetime) -> None:
+    """Legacy settlement: one reward at a time."""
+    pending = list(
+        PendingReward.select().where(
+            (PendingReward.status == "pending") &
+            (PendingReward.scheduled_at <= now)
+        )
+    )
+
+    for pr in pending:
         try:
-            now = datetime.now()
-            pending = list(
-                PendingReward.select().where(
-                    (PendingReward.status == "pending") &
-                    (PendingReward.scheduled_at <= now)
-                )
-            )
-
-            for pr in pending:
-                try:
-                    user = User.get_or_none(User.user_id == pr.user_id)
-                    if not user:
-                        pr.status = "completed"
-                        pr.save()
-                        continue
-
-                    if await award_user(user, pr.diamonds):
-                        pr.status = "completed"
-                        pr.save()
-
-                        title = pr.task_title or "задание"
-                        try:
-                            await bot.send_message(
-                                pr.user_id,
-                                f"💎 +{int(pr.diamonds)} алмазов за {title}"
-                            )
-                        except Exception:
-                            pass
-                except Exception as e:
-                    logger.exception(f"Ошибка награды {pr.id}: {e}")
+            user = User.get_or_none(User.user_id == pr.user_id)
+            if not user:
+                pr.status = "completed"
+                pr.save()
+                continue
+
+            if await award_user(user, pr.diamonds):
+                pr.status = "completed"
+                pr.save()
 
+                enqueue_message(pr.user_id, build_reward_digest([(int(pr.diamonds), pr.task_title)]))
+                wake_outbox()
         except Exception as e:
-            logger.exception(f"Ошибка обработки отложенных наград: {e}")
+            logger.exception(f"Ошибка награды {pr.id}: {e}")
+
+
+async def process_pending_rewards(workers: int = REWARD_WORKERS):
+    """Unified pending rewards processor, woken up by the reward scheduler.
+
+    In batch mode ``workers`` settlement loops drain the queue concurrently;
+    the row mode is single-worker only and must not run in several processes.
+    """
+    while True:
+        await reward_scheduler.wait_until_due()
+        now = datetime.now()
+        failed = False
+        async with jobs.timed("pending_rewards"):
+            try:
+                if REWARD_SETTLEMENT_MODE == "row":
+                    await _settle_row_by_row(now)
+                else:
+                    results = await asyncio.gather(
+                        *(settle_due_rewards(now) for _ in range(max(1, workers))),
+                        return_exceptions=True
+                    )
+                    for result in results:
+                        if isinstance(result, Exception):
+                            failed = True
+                            logger.error(f"Ошибка воркера наград: {result!r}")
+            except Exception as e:
+                failed = True
+                logger.exception(f"Ошибка обработки отложенных наград: {e}")
 
-        await asyncio.sleep(300)
+        if failed:
+            # Сроки остаются в расписании — повторим позже
+            await asyncio.sleep(REWARD_RETRY_DELAY)
+        else:
+            await reward_scheduler.discard_until(now)
@@ -1,5 +1,4 @@
 """Flyer tasks handler."""
-import asyncio
 import logging
 import inspect
 from datetime import datetime, timedelta
@@ -11,7 +10,13 @@ from aiogram.exceptions import TelegramBadRequest
 from flyerapi import Flyer # type: ignore
 
 from config import FLYER_KEY
-from database.models import User, PendingReward
+from database.repository import (
+    get_pending_reward,
+    get_task_keys,
+    increment_user_stats,
+    user_exists,
+)
+from handlers.tasks.reward_scheduler import schedule_reward
 from handlers.tasks.referral_service import process_referral_reward
 from handlers.tasks.subgram_tasks import create_navigation_keyboard
 
@@ -106,12 +111,7 @@ async def get_flyer_tasks(user_id: int) -> list[dict]:
         return []
 
     # Get completed tasks
-    completed = set(
-        key for (key,) in PendingReward.select(
-            PendingReward.task_key
-        ).where(PendingReward.user_id == user_id).tuples()
-        if key and str(key).startswith("flyer:")
-    )
+    completed = await get_task_keys(user_id, "flyer:")
 
     # Build task list
     tasks = []
@@ -237,16 +237,8 @@ async def check_flyer_task(call: CallbackQuery, state: FSMContext) -> None:
         await call.answer("❌ Некорректное задание.", show_alert=True)
         return
 
-    loop = asyncio.get_event_loop()
-    
     # Check if reward already received
-    existing = await loop.run_in_executor(
-        None,
-        lambda: PendingReward.get_or_none(
-            PendingReward.user_id == user_id,
-            PendingReward.task_key == f"flyer:{resource_id}"
-        )
-    )
+    existing = await get_pending_reward(user_id, f"flyer:{resource_id}")
     if existing and existing.created_at > datetime.now() - timedelta(hours=48):
         await call.answer("✅ Награда за это задание уже получена.", show_alert=True)
         return
@@ -260,31 +252,24 @@ async def check_flyer_task(call: CallbackQuery, state: FSMContext) -> None:
         return
 
     if status == "complete":
-        user = await loop.run_in_executor(
-            None,
-            lambda: User.get_or_none(User.user_id == user_id)
-        )
-        if not user:
+        if not await user_exists(user_id):
             await call.answer("⚠️ Пользователь не найден.", show_alert=True)
             return
 
         # Create pending reward
         scheduled_at = datetime.now() + timedelta(days=3)
-        PendingReward.get_or_create(
-            user_id=user_id,
-            task_key=f"flyer:{resource_id}",
-            defaults={
-                "task_title": f"задание «Подписка на канал {resource_id}»",
-                "diamonds": int(price),
-                "scheduled_at": scheduled_at,
-                "status": "pending",
-                "completed_at": datetime.now(),
-            }
+        await schedule_reward(
+            user_id,
+            f"flyer:{resource_id}",
+            f"задание «Подписка на канал {resource_id}»",
+            int(price),
+            scheduled_at,
         )
 
-        user.balance += price
-        user.task_count += 1
-        await loop.run_in_executor(None, lambda: user.save())
+        user = await increment_user_stats(user_id, balance=price, task_count=1, ref=f"flyer:{resource_id}")
+        if not user:
+            await call.answer("⚠️ Пользователь не найден.", show_alert=True)
+            return
 
         await process_referral_reward(user, float(price))
 
@@ -3,13 +3,22 @@ import logging
 from datetime import datetime, timedelta
 
 from aiogram import Router, F
-from aiogram.types import CallbackQuery
+from aiogram.types import CallbackQuery, ChatMemberUpdated
 from aiogram.fsm.context import FSMContext
 
-from database.models import Task, User, UserSubscriptions, PendingReward
+from database.claims import CLAIMED, ALREADY_CLAIMED
+from database.repository import (
+    claim_local_task,
+    get_active_tasks,
+    get_task,
+    get_user_channel_ids,
+    increment_user_stats,
+    set_subscription_left,
+)
+from handlers.membership import LEFT, membership_index
+from handlers.tasks.reward_scheduler import reward_scheduler
 from handlers.tasks.referral_service import process_referral_reward
-from handlers.tasks.subgram_tasks import log_subscription
-from loader import bot
+from handlers.telegram_cache import telegram_cache
 from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
@@ -18,13 +27,20 @@ router = Router()
 
 
 async def is_subscribed(user_id: int, chat_id: int) -> bool:
-    """Check if user is subscribed to chat."""
-    try:
-        member = await bot.get_chat_member(chat_id, user_id)
-        return member.status in ("member", "administrator", "creator", "restricted")
-    except Exception as e:
-        logger.debug(f"Failed to check subscription for {user_id} in {chat_id}: {e}")
-        return False
+    """Check if user is subscribed to chat (membership index, Bot API on a miss)."""
+    return await membership_index.is_member(chat_id, user_id)
+
+
+@router.chat_member()
+async def on_chat_member(update: ChatMemberUpdated) -> None:
+    """Keep the membership index current and record departures from credited channels."""
+    change = await membership_index.apply(update)
+    if change is None:
+        return
+    user_id = update.new_chat_member.user.id
+    left_at = datetime.now() if change == LEFT else None
+    if await set_subscription_left(user_id, update.chat.id, left_at) and change == LEFT:
+        logger.info(f"User {user_id} left credited chat {update.chat.id}")
 
 
 def get_local_task_keyboard(invite_link: str) -> dict:
@@ -42,35 +58,22 @@ async def get_local_tasks(user_id: int) -> list[dict]:
     Returns list of active tasks not yet completed by user.
     """
     # Get completed task IDs
-    completed_ids = set(
-        cid for (cid,) in UserSubscriptions.select(
-            UserSubscriptions.channel_id
-        ).where(UserSubscriptions.user_id == user_id).tuples()
-        if cid is not None
-    )
+    completed_ids = await get_user_channel_ids(user_id)
 
     # Get active tasks not completed by user
-    query = Task.select().where(Task.is_active)
-    if completed_ids:
-        query = query.where(~Task.chat_id.in_(completed_ids))
+    active_tasks = await get_active_tasks(exclude_chat_ids=completed_ids)
+
+    # Channel titles come from the metadata cache; unknown ones are fetched in the background
+    titles = await telegram_cache.chat_titles(task.chat_id for task in active_tasks)
 
     # Build task list
     tasks = []
-    for task in query:
-        # Try to get channel title, fallback to default if fails
-        channel_title = "Канал"
-        try:
-            chat = await bot.get_chat(chat_id=task.chat_id)
-            if chat.title:
-                channel_title = chat.title
-        except Exception as e:
-            logger.warning(f"Failed to get chat info for {task.chat_id}: {e}")
-
+    for task in active_tasks:
         tasks.append({
             "type": "local",
             "link": task.invite_link,
             "reward": task.reward,
-            "channel": channel_title,
+            "channel": titles.get(task.chat_id, "Канал"),
             "task_id": task.id,
             "chat_id": task.chat_id,
         })
@@ -116,7 +119,8 @@ async def check_local_task(call: CallbackQuery, state: FSMContext) -> None:
         await call.answer("Нет активного задания.", show_alert=True)
         return
 
-    task = Task.get_or_none(Task.id == task_id, Task.is_active == True)
+    # Закрытое задание не отсекаем здесь: выполнившему его claim ответит «Уже получено»
+    task = await get_task(task_id, active_only=False)
     if not task:
         await call.answer("Задание недоступно.", show_alert=True)
         return
@@ -124,73 +128,35 @@ async def check_local_task(call: CallbackQuery, state: FSMContext) -> None:
     user_id = call.from_user.id
     channel_id_val = int(task.chat_id)
 
-    # Check if already completed
-    if UserSubscriptions.select().where(
-        (UserSubscriptions.user_id == user_id) &
-        (UserSubscriptions.channel_id == channel_id_val)
-    ).exists():
-        await call.answer("✅ Уже получено!", show_alert=True)
-        return
-
     # Check if subscribed
     if not await is_subscribed(user_id, task.chat_id):
         await call.answer("❌ Вы не подписаны на канал!", show_alert=True)
         return
 
-    # Fraud detection
-    if await _is_fraud_attempt(user_id, channel_id_val):
-        user = User.get_or_none(User.user_id == user_id)
-        if user:
-            user.balance = max(0, user.balance - 10)
-            user.task_count = max(0, user.task_count - 5)
-            user.task_count_diamonds = max(0, user.task_count_diamonds - 5)
-            user.save()
-            UserSubscriptions.delete().where(UserSubscriptions.user_id == user_id).execute()
-        await call.answer("⚠️ Накрутка! Награда отменена.", show_alert=True)
-        await state.clear()
-        return
-
-    # Save pending reward
-    scheduled_at = datetime.now() + timedelta(days=3)
-    PendingReward.get_or_create(
-        user_id=user_id,
-        task_key=f"local:{task_id}",
-        defaults={
-            "task_title": f"задание «Подписка на канал {channel_id_val}»",
-            "diamonds": int(task.reward),
-            "scheduled_at": scheduled_at,
-            "status": "pending",
-            "completed_at": datetime.now(),
-        }
+    # Subscription, task counter and pending reward in one statement
+    result = await claim_local_task(
+        user_id,
+        task_id,
+        channel_id_val,
+        f"local:{task_id}",
+        f"задание «Подписка на канал {channel_id_val}»",
+        datetime.now() + timedelta(days=3),
     )
-
-    # Log subscription
-    await log_subscription(user_id, channel_id_val)
-
-    # Update task stats
-    Task.update(
-        current_subscribers=Task.current_subscribers + 1
-    ).where(Task.id == task_id).execute()
+    if result.status == ALREADY_CLAIMED:
+        await call.answer("✅ Уже получено!", show_alert=True)
+        return
+    if result.status != CLAIMED:
+        await call.answer("Задание недоступно.", show_alert=True)
+        return
+    if result.reward_id:
+        await reward_scheduler.add(result.reward_id, result.scheduled_at)
 
     # Update user stats
-    user = User.get_or_none(User.user_id == user_id)
+    user = await increment_user_stats(user_id, task_count=1, task_count_diamonds=task.reward)
     if user:
-        user.task_count += 1
-        user.task_count_diamonds += task.reward
-        user.save()
         await process_referral_reward(user, task.reward)
 
     await call.answer(
         f"✅ Проверка пройдена! Получите {task.reward} 💎 через 3 дня.",
         show_alert=True
     )
-
-
-async def _is_fraud_attempt(user_id: int, channel_id: int) -> bool:
-    """Check if multiple verification attempts in short time (fraud detection)."""
-    hour_ago = datetime.now() - timedelta(hours=1)
-    return UserSubscriptions.select().where(
-        (UserSubscriptions.user_id == user_id) &
-        (UserSubscriptions.channel_id == channel_id) &
-        (UserSubscriptions.timestamp > hour_ago)
-    ).count() >= 2
@@ -1,39 +1,70 @@
-import logging
-from database.models import User
-from loader import bot
+from typing import Optional
 
-async def process_referral_reward(user: User, task_reward: float):
-    if user.is_active_referral or user.task_count < 3 or not user.referral:
-        return
+from database import ledger
+from database.executor import run_db
+from database.models import db, User
+from database.outbox import enqueue_message
+from database.referrals import activation_counter_updates
+from database.user_cache import user_cache
+from handlers.notifications import wake_outbox
 
-    user.is_active_referral = True
-    user.save()
+# Дополнительно 3 алмаза за активацию реферала
+ACTIVATION_BONUS = 3
 
-    ref_id = user.referral  # Already an integer
-    referrer = User.get_or_none(User.user_id == ref_id)
-    if not referrer:
-        return
 
-    # Бонус 10% от награды за задание
-    bonus = int(round(task_reward * 0.1))
-    # Дополнительно 3 алмаза за активацию реферала
-    activation_bonus = 3
-    
-    referrer.balance += bonus + activation_bonus
-    referrer.referrals_count += 1
-    referrer.save()
-    
-    # Уведомление рефереру об активации
-    try:
-        username = user.username if user.username else f"ID{user.user_id}"
-        await bot.send_message(
-            ref_id,
-            f"🎉 <b>Ваш реферал стал активным!</b>\n\n"
-            f"👤 Реферал: @{username}\n"
-            f"💎 Награда за активацию: +{activation_bonus} алмазов\n"
-            f"💰 Бонус от задания: +{bonus} алмазов\n\n"
-            f"Теперь вы будете получать 10% от всех его наград!",
-            parse_mode="HTML"
+def _activation_text(username: str, bonus: int) -> str:
+    return (
+        f"🎉 <b>Ваш реферал стал активным!</b>\n\n"
+        f"👤 Реферал: @{username}\n"
+        f"💎 Награда за активацию: +{ACTIVATION_BONUS} алмазов\n"
+        f"💰 Бонус от задания: +{bonus} алмазов\n\n"
+        f"Теперь вы будете получать 10% от всех его наград!"
+    )
+
+
+def _activate_referral(user_id: int, username: str, task_reward: float) -> Optional[tuple[int, int]]:
+    """Mark the user as an active referral, pay the referrer and queue their notice.
+
+    Returns (referrer_id, bonus) if the referrer was credited.
+    """
+    with db.atomic():
+        rows = list(
+            User.update(is_active_referral=True)
+            .where(
+                (User.user_id == user_id) &
+                (User.is_active_referral == False) &
+                (User.task_count >= 3) &
+                User.referral.is_null(False)
+            )
+            .returning(User.referral)
+            .tuples()
+            .execute()
         )
-    except Exception as e:
-        logging.warning(f"Failed to notify referrer {ref_id}: {e}")
\ No newline at end of file
+        if not rows:
+            return None
+
+        ref_id = rows[0][0]
+        # Бонус 10% от награды за задание
+        bonus = int(round(task_reward * 0.1))
+        credited = User.update({
+            User.balance: User.balance + bonus + ACTIVATION_BONUS,
+            **activation_counter_updates(),
+        }).where(User.user_id == ref_id).execute()
+        if not credited:
+            return None
+        ledger.record(ref_id, bonus + ACTIVATION_BONUS, ledger.REFERRAL_BONUS, str(user_id))
+        # Уведомление рефереру об активации — в той же транзакции
+        enqueue_message(ref_id, _activation_text(username, bonus), parse_mode="HTML")
+        return ref_id, bonus
+
+
+async def process_referral_reward(user: User, task_reward: float):
+    if user.is_active_referral or user.task_count < 3 or not user.referral:
+        return
+
+    username = user.username if user.username else f"ID{user.user_id}"
+    activated = await run_db(_activate_referral, user.user_id, username, task_reward)
+    if activated:
+        ref_id, _ = activated
+        await user_cache.invalidate(user.user_id, ref_id)
+        wake_outbox()
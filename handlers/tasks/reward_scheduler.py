@@ -0,0 +1,123 @@
+"""Deadline-driven scheduling of pending rewards.
+
+Every pending reward is mirrored into a Redis sorted set scored by its
+``scheduled_at`` timestamp. The settlement loop sleeps until the earliest
+score instead of polling Postgres, and new rewards wake it up if they are
+due sooner. The set is rebuilt from the DB on first use and whenever Redis
+loses it (the sync marker disappears together with the data).
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from database.executor import run_db
+from database.models import PendingReward
+from database.repository import create_pending_reward
+from loader import redis_client
+
+logger = logging.getLogger(__name__)
+
+REWARD_DUE_KEY = "pending_rewards:due"
+REWARD_SYNC_MARKER_KEY = "pending_rewards:due:synced"
+# Верхняя граница сна: награды, добавленные другими процессами, видны не позже чем через это время
+MAX_SLEEP = 60
+# Если Redis недоступен — старый режим опроса
+FALLBACK_POLL_INTERVAL = 300
+REBUILD_CHUNK = 1000
+
+
+def _pending_deadlines() -> list[tuple[int, datetime]]:
+    return list(
+        PendingReward
+        .select(PendingReward.id, PendingReward.scheduled_at)
+        .where(PendingReward.status == "pending")
+        .tuples()
+    )
+
+
+class RewardScheduler:
+    """Redis-backed index of reward deadlines with an in-process wakeup."""
+
+    def __init__(self, redis, key: str = REWARD_DUE_KEY, marker_key: str = REWARD_SYNC_MARKER_KEY):
+        self._redis = redis
+        self._key = key
+        self._marker_key = marker_key
+        self._wakeup = asyncio.Event()
+
+    async def add(self, reward_id: int, scheduled_at: datetime) -> None:
+        """Register a new pending reward deadline."""
+        try:
+            await self._redis.zadd(self._key, {str(reward_id): scheduled_at.timestamp()})
+        except Exception as e:
+            logger.warning(f"Не удалось добавить награду {reward_id} в расписание: {e}")
+        self._wakeup.set()
+
+    async def rebuild(self) -> int:
+        """Load every pending reward deadline from the DB.
+
+        The set is merged rather than replaced, so deadlines added while the
+        DB was being read are kept; stale members only cause one empty
+        settlement pass and are then discarded.
+        """
+        rows = await run_db(_pending_deadlines)
+        pipe = self._redis.pipeline()
+        for i in range(0, len(rows), REBUILD_CHUNK):
+            chunk = rows[i:i + REBUILD_CHUNK]
+            pipe.zadd(self._key, {str(reward_id): ts.timestamp() for reward_id, ts in chunk})
+        pipe.set(self._marker_key, int(time.time()))
+        await pipe.execute()
+        logger.info(f"Расписание наград восстановлено из БД: {len(rows)}")
+        return len(rows)
+
+    async def next_deadline(self) -> Optional[float]:
+        """Earliest scheduled timestamp, or None if nothing is pending."""
+        if not await self._redis.exists(self._marker_key):
+            await self.rebuild()
+        head = await self._redis.zrange(self._key, 0, 0, withscores=True)
+        return head[0][1] if head else None
+
+    async def wait_until_due(self) -> None:
+        """Sleep until at least one reward is due."""
+        while True:
+            self._wakeup.clear()
+            try:
+                deadline = await self.next_deadline()
+            except Exception as e:
+                logger.warning(f"Расписание наград недоступно, опрос раз в {FALLBACK_POLL_INTERVAL} с: {e}")
+                await asyncio.sleep(FALLBACK_POLL_INTERVAL)
+                return
+
+            delay = MAX_SLEEP if deadline is None else deadline - time.time()
+            if delay <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, MAX_SLEEP))
+            except asyncio.TimeoutError:
+                pass
+
+    async def discard_until(self, moment: datetime) -> None:
+        """Forget deadlines up to ``moment`` once they have been settled."""
+        try:
+            await self._redis.zremrangebyscore(self._key, "-inf", moment.timestamp())
+        except Exception as e:
+            logger.warning(f"Не удалось очистить расписание наград: {e}")
+
+
+reward_scheduler = RewardScheduler(redis_client)
+
+
+async def schedule_reward(
+    user_id: int,
+    task_key: str,
+    task_title: str,
+    diamonds: int,
+    scheduled_at: datetime,
+) -> bool:
+    """Create a pending reward and register its deadline. Returns True if new."""
+    reward = await create_pending_reward(user_id, task_key, task_title, diamonds, scheduled_at)
+    if reward is None:
+        return False
+    await reward_scheduler.add(reward.id, reward.scheduled_at)
+    return True
@@ -11,7 +11,12 @@ from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 from config import subgram_api
-from database.models import User, PendingReward, UserSubscriptions
+from database.repository import (
+    get_task_keys,
+    increment_user_stats,
+    record_subscription,
+)
+from handlers.tasks.reward_scheduler import schedule_reward
 from handlers.tasks.referral_service import process_referral_reward
 from loader import bot
 
@@ -150,11 +155,7 @@ def create_navigation_keyboard(
 
 async def log_subscription(user_id: int, channel_id: int) -> None:
     """Log user subscription."""
-    UserSubscriptions.get_or_create(
-        user_id=user_id,
-        channel_id=channel_id,
-        defaults={'timestamp': datetime.now()}
-    )
+    await record_subscription(user_id, channel_id)
 
 
 def clear_subgram_cache() -> None:
@@ -211,12 +212,7 @@ async def get_subgram_tasks(user_id: int, chat_id: int) -> list[dict]:
         return []
 
     # Get completed tasks
-    completed = set(
-        key for (key,) in PendingReward.select(
-            PendingReward.task_key
-        ).where(PendingReward.user_id == user_id).tuples()
-        if key and str(key).startswith("subgram:")
-    )
+    completed = await get_task_keys(user_id, "subgram:")
 
     # Build task list
     tasks = []
@@ -346,23 +342,16 @@ async def check_subgram_task(call: CallbackQuery, state: FSMContext) -> None:
     # Task completed - save reward and update user
 
     scheduled_at = datetime.now() + timedelta(days=3)
-    PendingReward.get_or_create(
-        user_id=user_id,
-        task_key=f"subgram:{current_link}",
-        defaults={
-            "task_title": f"задание «Подписка на канал {current_link}»",
-            "diamonds": int(current_reward),
-            "scheduled_at": scheduled_at,
-            "status": "pending",
-            "completed_at": datetime.now(),
-        }
+    await schedule_reward(
+        user_id,
+        f"subgram:{current_link}",
+        f"задание «Подписка на канал {current_link}»",
+        int(current_reward),
+        scheduled_at,
     )
 
-    user = User.get_or_none(User.user_id == user_id)
+    user = await increment_user_stats(user_id, task_count=1, task_count_diamonds=current_reward)
     if user:
-        user.task_count += 1
-        user.task_count_diamonds += current_reward
-        user.save()
         await process_referral_reward(user, current_reward)
 
     await call.answer(
@@ -9,10 +9,12 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from database.models import User, UserSubscriptions, PendingReward, Task
+from database.claims import CLAIMED, ALREADY_CLAIMED
+from database.repository import claim_local_task
+from handlers.tasks.reward_scheduler import schedule_reward, reward_scheduler
 from handlers.tasks.subgram_tasks import get_subgram_tasks, fetch_subgram_links
 from handlers.tasks.flyer_tasks import get_flyer_tasks, flyer
-from handlers.tasks.local_tasks import get_local_tasks, is_subscribed, _is_fraud_attempt
+from handlers.tasks.local_tasks import get_local_tasks, is_subscribed
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -308,17 +310,7 @@ async def _schedule_reward(user_id: int, task: dict) -> None:
         return
 
     scheduled_at = datetime.now() + timedelta(days=TASK_REWARD_DELAY_DAYS)
-    PendingReward.get_or_create(
-        user_id=user_id,
-        task_key=task_key,
-        defaults={
-            "task_title": _task_title(task),
-            "diamonds": diamonds,
-            "scheduled_at": scheduled_at,
-            "status": "pending",
-            "completed_at": datetime.now(),
-        }
-    )
+    await schedule_reward(user_id, task_key, _task_title(task), diamonds, scheduled_at)
 
 
 async def _check_subgram(call: CallbackQuery, task: dict) -> bool:
@@ -406,43 +398,28 @@ async def _check_local(call: CallbackQuery, task: dict) -> bool:
 
     logger.info(f"[Local] User {user_id} checking task: task_id={task_id}, chat_id={chat_id}")
 
-    channel_id_val = int(chat_id)
-    if UserSubscriptions.select().where(
-        (UserSubscriptions.user_id == user_id) &
-        (UserSubscriptions.channel_id == channel_id_val)
-    ).exists():
-        logger.info(f"[Local] Task already claimed by user {user_id}: task_id={task_id}")
-        await call.answer("✅ Уже получено!", show_alert=True)
-        return False
-
     if not await is_subscribed(user_id, chat_id):
         logger.info(f"[Local] User {user_id} NOT subscribed to chat_id={chat_id}")
         await call.answer("❌ Не выполнено. Попробуйте ещё раз.", show_alert=True)
         return False
 
-    if await _is_fraud_attempt(user_id, channel_id_val):
-        logger.warning(f"[Local] ⚠️ FRAUD DETECTED for user {user_id} on chat_id={chat_id}")
-        user = User.get_or_none(User.user_id == user_id)
-        if user:
-            user.balance = max(0, user.balance - 10)
-            user.task_count = max(0, user.task_count - 5)
-            user.task_count_diamonds = max(0, user.task_count_diamonds - 5)
-            user.save()
-            UserSubscriptions.delete().where(UserSubscriptions.user_id == user_id).execute()
-        await call.answer("⚠️ Накрутка! Награда отменена.", show_alert=True)
-        return False
-
-    UserSubscriptions.get_or_create(
-        user_id=user_id,
-        channel_id=channel_id_val,
-        defaults={"timestamp": datetime.now()}
+    result = await claim_local_task(
+        user_id,
+        int(task_id),
+        int(chat_id),
+        _task_key(task),
+        _task_title(task),
+        datetime.now() + timedelta(days=TASK_REWARD_DELAY_DAYS),
     )
-
-    Task.update(
-        current_subscribers=Task.current_subscribers + 1
-    ).where(Task.id == task_id).execute()
-
-    await _schedule_reward(user_id, task)
+    if result.status == ALREADY_CLAIMED:
+        logger.info(f"[Local] Task already claimed by user {user_id}: task_id={task_id}")
+        await call.answer("✅ Уже получено!", show_alert=True)
+        return False
+    if result.status != CLAIMED:
+        await call.answer("Задание недоступно.", show_alert=True)
+        return False
+    if result.reward_id:
+        await reward_scheduler.add(result.reward_id, result.scheduled_at)
     logger.info(f"[Local] ✅ Task COMPLETED by user {user_id}: task_id={task_id}, chat_id={chat_id}, reward: {task.get('reward')}")
     await call.answer("✅ Выполнено. Награда будет начислена через 3 дня.", show_alert=True)
     return True
@@ -0,0 +1,177 @@
+"""Shared cache of Telegram metadata: chat titles/types, bot identity, bot admin rights.
+
+Chat metadata lives in Redis hashes (``tg:chat:<id>``) shared by all bot
+processes, with a small in-process LRU in front. The request path never
+calls ``get_chat`` for titles: ``chat_titles`` answers from the cache and
+queues unknown chats, and the ``chat_metadata`` maintenance job fetches
+them together with a periodic refresh of every active task's channel.
+Write-through happens wherever a handler has already fetched a chat.
+
+The bot's own ID comes from the token, so checking admin rights costs one
+``get_chat_member`` call, and a positive answer is cached for
+``BOT_ADMIN_TTL`` seconds. A negative one is not cached, so an owner who has
+just promoted the bot can retry at once.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from aiogram.types import Chat
+
+from config import CHAT_META_REFRESH_INTERVAL
+from loader import bot, redis_client
+
+logger = logging.getLogger(__name__)
+
+CHAT_KEY_PREFIX = "tg:chat:"
+BOT_ADMIN_KEY_PREFIX = "tg:bot_admin:"
+MISSING_CHATS_KEY = "tg:chat:missing"
+CHAT_META_TTL = CHAT_META_REFRESH_INTERVAL * 3  # Переживает два пропущенных обновления
+BOT_ADMIN_TTL = 600  # секунды
+LOCAL_TTL = 300  # секунды в памяти процесса
+LOCAL_MAX_SIZE = 2048
+REFRESH_PAUSE = 0.05  # пауза между get_chat при обновлении, секунды
+
+
+class _LRU:
+    """Bounded in-process cache with per-entry expiry."""
+
+    def __init__(self, max_size: int = LOCAL_MAX_SIZE, ttl: float = LOCAL_TTL):
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self._max_size = max_size
+        self._ttl = ttl
+
+    def get(self, key: Any) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Any, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self._ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self._max_size:
+            self._data.popitem(last=False)
+
+
+class TelegramCache:
+    """Redis + LRU cache of chat metadata and bot-related lookups."""
+
+    def __init__(self, bot, redis):
+        self._bot = bot
+        self._redis = redis
+        self._chats = _LRU()
+
+    # ---- bot identity --------------------------------------------------
+
+    @property
+    def bot_id(self) -> int:
+        """The bot's own user ID, parsed from the token (no ``get_me`` call)."""
+        return self._bot.id
+
+    # ---- chats ----------------------------------------------------------
+
+    async def store_chat(self, chat: Chat) -> None:
+        """Write through a chat the caller has just fetched."""
+        meta = {"title": chat.title or "", "type": chat.type, "username": chat.username or ""}
+        self._chats.set(chat.id, meta)
+        key = f"{CHAT_KEY_PREFIX}{chat.id}"
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=meta)
+                pipe.expire(key, CHAT_META_TTL)
+                pipe.srem(MISSING_CHATS_KEY, str(chat.id))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить данные чата {chat.id}: {e}")
+
+    async def chats(self, chat_ids: Iterable[int]) -> dict[int, dict[str, str]]:
+        """Cached metadata for the given chats; unknown chats are queued for the refresher."""
+        found: dict[int, dict[str, str]] = {}
+        lookup = []
+        for chat_id in dict.fromkeys(chat_ids):
+            meta = self._chats.get(chat_id)
+            if meta is None:
+                lookup.append(chat_id)
+            else:
+                found[chat_id] = meta
+        if not lookup:
+            return found
+
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for chat_id in lookup:
+                    pipe.hgetall(f"{CHAT_KEY_PREFIX}{chat_id}")
+                rows = await pipe.execute()
+            missing = []
+            for chat_id, raw in zip(lookup, rows):
+                if not raw:
+                    missing.append(str(chat_id))
+                    continue
+                meta = {key.decode(): value.decode() for key, value in raw.items()}
+                self._chats.set(chat_id, meta)
+                found[chat_id] = meta
+            if missing:
+                await self._redis.sadd(MISSING_CHATS_KEY, *missing)
+        except Exception as e:
+            logger.warning(f"Кэш данных чатов недоступен: {e}")
+        return found
+
+    async def chat_titles(self, chat_ids: Iterable[int]) -> dict[int, str]:
+        """Known non-empty titles of the given chats (never calls the Bot API)."""
+        return {chat_id: meta["title"] for chat_id, meta in (await self.chats(chat_ids)).items() if meta.get("title")}
+
+    async def refresh_chats(self, chat_ids: Iterable[int]) -> int:
+        """Fetch chats from the Bot API (background only). Returns how many were stored."""
+        try:
+            queued = {int(chat_id) for chat_id in await self._redis.smembers(MISSING_CHATS_KEY)}
+        except Exception as e:
+            logger.warning(f"Очередь чатов для обновления недоступна: {e}")
+            queued = set()
+
+        refreshed = 0
+        for chat_id in set(chat_ids) | queued:
+            try:
+                chat = await self._bot.get_chat(chat_id)
+            except Exception as e:
+                logger.debug(f"Не удалось получить чат {chat_id}: {e}")
+                if chat_id in queued:
+                    try:
+                        await self._redis.srem(MISSING_CHATS_KEY, str(chat_id))
+                    except Exception:
+                        pass
+            else:
+                await self.store_chat(chat)
+                refreshed += 1
+            await asyncio.sleep(REFRESH_PAUSE)
+        return refreshed
+
+    # ---- bot admin rights -----------------------------------------------
+
+    async def bot_is_admin(self, chat_id: int) -> bool:
+        """Whether the bot is an administrator of the chat; Bot API errors propagate."""
+        key = f"{BOT_ADMIN_KEY_PREFIX}{chat_id}"
+        try:
+            if await self._redis.exists(key):
+                return True
+        except Exception as e:
+            logger.warning(f"Кэш прав бота недоступен: {e}")
+
+        member = await self._bot.get_chat_member(chat_id, self.bot_id)
+        is_admin = member.status in ("administrator", "creator")
+        if is_admin:
+            try:
+                await self._redis.set(key, "1", ex=BOT_ADMIN_TTL)
+            except Exception:
+                pass
+        return is_admin
+
+
+telegram_cache = TelegramCache(bot, redis_client)
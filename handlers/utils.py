@@ -2,14 +2,16 @@
 import logging
 import re
 from datetime import datetime
-from database.models import User, Root
+from database.models import db, User
+from database.referrals import on_referral_registered
+from handlers.admin_cache import admin_cache as _admin_cache
 
 logger = logging.getLogger(__name__)
 
 
 def is_admin(user_id: int) -> bool:
-    """Check if user is admin."""
-    return Root.get_or_none(Root.root_id == user_id) is not None
+    """Check if user is admin (in-memory, no DB query)."""
+    return _admin_cache.contains(user_id)
 
 
 def get_task_completion_count(user_id: int) -> int:
@@ -20,7 +22,8 @@ def get_task_completion_count(user_id: int) -> int:
 
 def get_referral_count(user_id: int) -> int:
     """Get number of referrals for user."""
-    return User.select().where(User.referral == user_id).count()
+    row = User.select(User.active_referrals + User.pending_referrals).where(User.user_id == user_id).tuples().first()
+    return int(row[0]) if row else 0
 
 
 def create_user(user_id: int, referrer_id: int | None, tg_user) -> User:
@@ -30,31 +33,29 @@ def create_user(user_id: int, referrer_id: int | None, tg_user) -> User:
     # Allow only safe characters; replace others with underscore
     username = re.sub(r'[^\w\-_.]', '_', raw_username[:32]).strip('_') or f"user{user_id}"
 
-    # Create user record
-    user = User.create(
-        user_id=user_id,
-        username=username,
-        balance=0,
-        date=datetime.now(),
-        referral=referrer_id,
-        boost=False,
-        last_farm_time=None,
-        last_active=datetime.now(),
-        task_count=0,
-        task_count_diamonds=0,
-        can_exchange=False,
-        referrals_count=0,
-        is_active_referral=False
-    )
-    
-    # Update referrer's count if valid referral
-    if referrer_id:
-        try:
-            referrer = User.get_by_id(referrer_id)
-            referrer.referrals_count += 1
-            referrer.save()
-            logger.info(f"Referral tracked: user {user_id} → referrer {referrer_id}")
-        except User.DoesNotExist:
-            logger.warning(f"Invalid referrer ID {referrer_id} for new user {user_id}")
-    
+    with db.atomic():
+        # Create user record
+        user = User.create(
+            user_id=user_id,
+            username=username,
+            balance=0,
+            date=datetime.now(),
+            referral=referrer_id,
+            boost=False,
+            last_farm_time=None,
+            last_active=datetime.now(),
+            task_count=0,
+            task_count_diamonds=0,
+            can_exchange=False,
+            referrals_count=0,
+            is_active_referral=False
+        )
+
+        # Update referrer's counters if valid referral
+        if referrer_id:
+            if on_referral_registered(referrer_id):
+                logger.info(f"Referral tracked: user {user_id} → referrer {referrer_id}")
+            else:
+                logger.warning(f"Invalid referrer ID {referrer_id} for new user {user_id}")
+
     return user
@@ -2,7 +2,9 @@ import logging
 import asyncio
 
 from loader import dp, bot
-from database.models import create_tables_safe
+from database.executor import shutdown_executor
+from database.migrations import DB_MIGRATE_ON_START, run_migrations
+from middlewares import DatabaseMiddleware
 from mini_app.server import start_mini_app_server
 
 # Routers
@@ -15,6 +17,11 @@ from handlers.exchange_stars import router as exchange_router
 from handlers.minigame import router as minigame_router
 from handlers.topup import router as topup_router
 from handlers.tasks.background_tasks import process_pending_rewards
+from handlers.notifications import process_outbox
+from handlers.leader import leader
+from handlers.admin_cache import admin_cache
+from handlers.jobs import jobs
+from handlers.maintenance import register_jobs
 
 logging.basicConfig(
     level=logging.INFO,
@@ -27,9 +34,12 @@ logging.basicConfig(
 async def main():
     """Initialize and run the bot."""
     logging.info("Запуск бота...")
-    create_tables_safe()
+    if DB_MIGRATE_ON_START:
+        run_migrations()
     mini_app_runner = None
 
+    dp.update.outer_middleware(DatabaseMiddleware())
+
     # Register routers
     dp.include_router(start_router)
     dp.include_router(menu_router)
@@ -40,15 +50,28 @@ async def main():
     dp.include_router(topup_router)
     dp.include_router(tasks_router)
 
-    # Start background tasks
-    asyncio.create_task(process_pending_rewards())
+    # Admin IDs are answered from memory; every process follows changes
+    await admin_cache.reload()
+    admin_listener = asyncio.create_task(admin_cache.listen())
+
+    # Background loops run only in the elected process
+    leader.singleton("pending_rewards", process_pending_rewards)
+    leader.singleton("outbox", process_outbox)
+    register_jobs()
+    leader.singleton("scheduler", jobs.run)
+    election = asyncio.create_task(leader.run())
 
     try:
         mini_app_runner = await start_mini_app_server()
-        await dp.start_polling(bot)
+        # chat_member updates are opt-in; request every type a handler is registered for
+        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        election.cancel()
+        admin_listener.cancel()
+        await leader.release()
         if mini_app_runner:
             await mini_app_runner.cleanup()
+        shutdown_executor()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,4 @@
+"""Dispatcher middlewares."""
+from .database import DatabaseMiddleware
+
+__all__ = ["DatabaseMiddleware"]
@@ -0,0 +1,60 @@
+"""Per-update database connection scoping and DB overload handling."""
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from database.executor import DatabaseBusy
+from database.models import db, is_pooled
+
+logger = logging.getLogger(__name__)
+
+BUSY_TEXT = "⚠️ Сервис перегружен. Попробуйте через минуту."
+
+
+class DatabaseMiddleware(BaseMiddleware):
+    """Scope the event-loop thread's pooled connection to in-flight updates.
+
+    peewee binds connections to threads and every update shares the loop
+    thread. The first inline query of an update checks a connection out
+    (autoconnect), and it goes back to the pool once no update is running.
+    Updates rejected by the DB executor get a short "try later" reply.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        self._in_flight += 1
+        try:
+            return await handler(event, data)
+        except DatabaseBusy as e:
+            logger.warning(f"Update dropped, DB is busy: {e}")
+            await _answer_busy(event)
+        finally:
+            self._in_flight -= 1
+            if (
+                is_pooled()
+                and not self._in_flight
+                and not db.is_closed()
+                and not db.in_transaction()
+            ):
+                db.close()
+
+
+async def _answer_busy(event: TelegramObject) -> None:
+    if not isinstance(event, Update):
+        return
+    try:
+        if event.callback_query:
+            await event.callback_query.answer(BUSY_TEXT, show_alert=True)
+        elif event.message:
+            await event.message.answer(BUSY_TEXT)
+    except Exception as e:
+        logger.debug(f"Failed to send busy notice: {e}")
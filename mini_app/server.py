@@ -5,7 +5,8 @@ import random
 from aiohttp import web
 
 from config import MINI_APP_HOST, MINI_APP_PORT
-from database.models import User
+from database import ledger
+from database.repository import get_balance, charge_balance, add_balance
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +23,7 @@ async def user_balance(request: web.Request) -> web.Response:
     if not user_id_raw or not user_id_raw.isdigit():
         return web.json_response({"ok": False, "error": "invalid_user_id"}, status=400)
 
-    user = User.get_or_none(User.user_id == int(user_id_raw))
-    balance = int(user.balance) if user else 0
+    balance = await get_balance(int(user_id_raw))
 
     return web.json_response({"ok": True, "balance": balance})
 
@@ -56,11 +56,9 @@ async def play_game(request: web.Request) -> web.Response:
     user_id = int(user_id_raw)
     game = GAMES[game_key]
 
-    if not User.update(balance=User.balance - 5).where(
-        (User.user_id == user_id) & (User.balance >= 5)
-    ).execute():
-        user = User.get_or_none(User.user_id == user_id)
-        balance = int(user.balance) if user else 0
+    balance = await charge_balance(user_id, 5, ledger.MINIGAME_BET, f"mini_app:{game_key}")
+    if balance is None:
+        balance = await get_balance(user_id)
         return web.json_response(
             {
                 "ok": False,
@@ -75,10 +73,7 @@ async def play_game(request: web.Request) -> web.Response:
     reward = game["reward"] if won else 0
 
     if reward:
-        User.update(balance=User.balance + reward).where(User.user_id == user_id).execute()
-
-    user = User.get_or_none(User.user_id == user_id)
-    balance = int(user.balance) if user else 0
+        balance = await add_balance(user_id, reward, ledger.MINIGAME_WIN, f"mini_app:{game_key}") or 0
 
     return web.json_response(
         {